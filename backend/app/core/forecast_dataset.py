@@ -0,0 +1,285 @@
+"""
+pyarrow.dataset view of the forecast data drop.
+
+The drop is a Hive-style tree of week_start_date=/family=/channel_online_offline=
+directories holding part-* files, as CSV under data/ or as Snappy Parquet under
+data_parquet/ (see convert_forecast_csv_to_parquet). Partition values are taken from the
+directory names by pyarrow's Hive partitioning. Filters on them are checked against the
+directory names while walking the tree, so a load of one week or one family never lists
+the directories or files of the others.
+"""
+
+from datetime import date
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import unquote
+import functools
+import operator
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+from core.forecast_loader import CSV_COLUMNS, NUMERIC_COLUMNS, STRING_COLUMNS
+
+# Data directory per source format, relative to the application root
+FORECAST_DATA_DIRS = {
+    "csv": Path("data"),
+    "parquet": Path("data_parquet"),
+}
+
+PART_FILE_PATTERNS = {
+    "csv": "part-*.csv",
+    "parquet": "part-*.parquet",
+}
+
+# Partition values are read as strings. week_start_date values are ISO dates, so range
+# filters compare correctly on the strings, and a malformed directory name is reported
+# for its partition instead of failing discovery of the whole tree.
+FORECAST_HIVE_SCHEMA = pa.schema([
+    ("week_start_date", pa.string()),
+    ("family", pa.string()),
+    ("channel_online_offline", pa.string()),
+])
+
+# Column types for reading the CSV drop with pyarrow, matching how the pandas loader reads it
+CSV_COLUMN_TYPES = {
+    **{col: pa.string() for col in STRING_COLUMNS + ['class']},
+    **{col: pa.float64() for col in NUMERIC_COLUMNS if col != 'wom'},
+    'wom': pa.int64(),
+}
+
+# pandas' default NA strings, so both readers see the same missing values
+CSV_NULL_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+
+PARQUET_ROWS_PER_GROUP = 100000
+
+
+def forecast_partitioning():
+    return ds.partitioning(FORECAST_HIVE_SCHEMA, flavor="hive")
+
+
+def forecast_partition_filter(
+    week_start_from: Optional[date] = None,
+    week_start_to: Optional[date] = None,
+    super_categories: Optional[List[str]] = None,
+    store_types: Optional[List[str]] = None,
+):
+    """
+    Build a filter on the partition directories
+
+    Parameters:
+    - week_start_from / week_start_to: inclusive week_start_date range
+    - super_categories: family values to keep
+    - store_types: channel_online_offline values to keep
+
+    Returns:
+        Dict of pyarrow.dataset Expression per filtered partition field, or None when
+        nothing is filtered
+    """
+    conditions = {}
+    if week_start_from:
+        conditions["week_start_date"] = ds.field("week_start_date") >= week_start_from.isoformat()
+    if week_start_to:
+        condition = ds.field("week_start_date") <= week_start_to.isoformat()
+        conditions["week_start_date"] = conditions["week_start_date"] & condition if week_start_from else condition
+    if super_categories:
+        conditions["family"] = ds.field("family").isin(super_categories)
+    if store_types:
+        conditions["channel_online_offline"] = ds.field("channel_online_offline").isin(store_types)
+    return conditions or None
+
+
+def partition_value_matches(condition, field, value):
+    return pa.table({field: pa.array([value], pa.string())}).filter(condition).num_rows > 0
+
+
+def matching_partition_dirs(data_dir, partition_filter):
+    """
+    Directories under data_dir whose partition values pass partition_filter. The tree is
+    walked only as deep as the last filtered field, and only into matching directories.
+    """
+    fields = FORECAST_HIVE_SCHEMA.names
+    depth = max(fields.index(field) for field in partition_filter) + 1
+    directories = [data_dir]
+    for field in fields[:depth]:
+        condition = partition_filter.get(field)
+        matching = []
+        for directory in directories:
+            for entry in os.scandir(directory):
+                key, _, value = entry.name.partition("=")
+                if key != field or not entry.is_dir():
+                    continue
+                if condition is None or partition_value_matches(condition, field, unquote(value)):
+                    matching.append(Path(entry.path))
+        directories = matching
+    return directories
+
+
+def list_part_files(file_format="csv", data_dir=None, partition_filter=None):
+    """
+    Part files of the data drop that match partition_filter
+
+    Files are listed without being opened: the dataset is given the partition schema
+    instead of inferring one from a file. Files and directories starting with "_" or "."
+    (e.g. _SUCCESS) are skipped. With a filter, only the matching partition directories
+    are listed (see matching_partition_dirs).
+
+    Returns:
+        Sorted list of (path, {"week_start_date", "family", "channel_online_offline"}).
+        Values missing from the path are absent from the dict.
+    """
+    data_dir = Path(data_dir or FORECAST_DATA_DIRS[file_format])
+    if partition_filter is None:
+        source, fragment_filter = str(data_dir), None
+    else:
+        source = []
+        for directory in matching_partition_dirs(data_dir, partition_filter):
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [name for name in dirs if not name.startswith(("_", "."))]
+                source.extend(os.path.join(root, name) for name in files if not name.startswith(("_", ".")))
+        if not source:
+            return []
+        fragment_filter = functools.reduce(operator.and_, partition_filter.values())
+    dataset = ds.dataset(
+        source,
+        format=file_format,
+        partitioning=forecast_partitioning(),
+        partition_base_dir=str(data_dir),
+        schema=FORECAST_HIVE_SCHEMA,
+    )
+
+    part_files = []
+    for fragment in dataset.get_fragments(filter=fragment_filter):
+        if not fnmatch(Path(fragment.path).name, PART_FILE_PATTERNS[file_format]):
+            continue
+        part_files.append((fragment.path, ds.get_partition_keys(fragment.partition_expression)))
+    return sorted(part_files, key=lambda part_file: part_file[0])
+
+
+def scan_partitions(file_format="csv", data_dir=None, partition_filter=None):
+    """
+    Group the matching part files by partition directory and stat them
+
+    Returns:
+        Tuple of (partitions, errors). Each partition is a dict with path, week_start_date,
+        super_category, store_type, files ([{"path", "size", "mtime"}]) and success_marker.
+        Files outside a complete partition path are skipped.
+    """
+    partitions = {}
+    errors = []
+
+    for part_file, values in list_part_files(file_format, data_dir, partition_filter):
+        week_start_date = values.get("week_start_date")
+        super_category = values.get("family")
+        store_type = values.get("channel_online_offline")
+        if not (week_start_date and super_category and store_type):
+            continue
+
+        partition_path = str(Path(part_file).parent)
+        if partition_path not in partitions:
+            try:
+                partition_date = pd.to_datetime(week_start_date).date()
+            except (ValueError, TypeError) as e:
+                errors.append(f"Error processing partition {partition_path}: {str(e)}")
+                partitions[partition_path] = None
+                continue
+            partitions[partition_path] = {
+                "path": partition_path,
+                "week_start_date": partition_date,
+                "super_category": super_category,
+                "store_type": store_type,
+                "files": [],
+                "success_marker": (Path(partition_path) / "_SUCCESS").exists(),
+            }
+        if partitions[partition_path] is None:
+            continue
+
+        stat = os.stat(part_file)
+        partitions[partition_path]["files"].append(
+            {"path": part_file, "size": stat.st_size, "mtime": stat.st_mtime}
+        )
+
+    return [partition for partition in partitions.values() if partition is not None], errors
+
+
+def convert_forecast_csv_to_parquet(source_dir=None, output_dir=None, partition_filter=None):
+    """
+    Rewrite the CSV drop (or the partitions matching partition_filter) as Snappy Parquet
+    with the same Hive layout, keeping only the columns the loader reads. Partitions that
+    are written replace their earlier Parquet files, and _SUCCESS markers are copied.
+
+    Runs synchronously; call it from a worker thread.
+
+    Returns:
+        Dict with partitions_converted, files_converted and rows_written
+    """
+    source_dir = Path(source_dir or FORECAST_DATA_DIRS["csv"])
+    output_dir = Path(output_dir or FORECAST_DATA_DIRS["parquet"])
+
+    part_files = list_part_files("csv", source_dir, partition_filter)
+    if not part_files:
+        return {"partitions_converted": 0, "files_converted": 0, "rows_written": 0}
+
+    source = ds.dataset(
+        [path for path, _ in part_files],
+        format=ds.CsvFileFormat(
+            convert_options=pacsv.ConvertOptions(
+                column_types=CSV_COLUMN_TYPES,
+                null_values=CSV_NULL_VALUES,
+                strings_can_be_null=True,
+            )
+        ),
+        partitioning=forecast_partitioning(),
+        partition_base_dir=str(source_dir),
+    )
+    # Keep the columns the loader reads, plus the partition columns to write the layout
+    columns = [
+        name for name in source.schema.names
+        if name in CSV_COLUMNS or name in FORECAST_HIVE_SCHEMA.names
+    ]
+
+    rows_written = 0
+    written_files = []
+
+    def file_visitor(written_file):
+        nonlocal rows_written
+        written_files.append(written_file.path)
+        rows_written += written_file.metadata.num_rows
+
+    ds.write_dataset(
+        source.scanner(columns=columns),
+        str(output_dir),
+        format="parquet",
+        partitioning=forecast_partitioning(),
+        file_options=ds.ParquetFileFormat().make_write_options(compression="snappy"),
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=PARQUET_ROWS_PER_GROUP,
+        preserve_order=True,
+        file_visitor=file_visitor,
+    )
+
+    # Mark converted partitions complete where the source partition was
+    converted_partitions = {str(Path(path).parent) for path in written_files}
+    source_partitions = {
+        (values.get("week_start_date"), values.get("family"), values.get("channel_online_offline")):
+            Path(path).parent
+        for path, values in part_files
+    }
+    for output_path, values in list_part_files("parquet", output_dir, partition_filter):
+        key = (values.get("week_start_date"), values.get("family"), values.get("channel_online_offline"))
+        if key in source_partitions and (source_partitions[key] / "_SUCCESS").exists():
+            (Path(output_path).parent / "_SUCCESS").touch()
+
+    return {
+        "partitions_converted": len(converted_partitions),
+        "files_converted": len(part_files),
+        "rows_written": rows_written,
+    }
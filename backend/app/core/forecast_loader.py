@@ -0,0 +1,526 @@
+"""
+Forecast CSV and Parquet ingestion for POST /core/load-data.
+
+The data directory is a tree of week_start_date=/family=/channel_online_offline=
+partitions, listed by core/forecast_dataset.py. Each loaded partition is recorded in forecast_load_manifest with the size,
+mtime and checksum of its part files, so later loads only replace partitions that are
+new or changed.
+
+Parsing and type coercion of the part files is CPU bound, so it runs in a pool of
+worker processes. Workers read the part files in chunks of LOAD_CHUNK_ROWS rows and send
+each chunk, as column lists ready for COPY, through a small bounded queue to the loader,
+which copies it into Postgres before the next one is parsed. Memory use depends on the
+chunk size, not on the size of a partition.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from pathlib import Path
+import asyncio
+import hashlib
+import os
+import queue
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+from sqlalchemy import select, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.inspection import inspect
+
+from schema import Forecast, ForecastLoadManifest
+from db.partitions import attach_week_partition, drop_week_partitions, is_partitioned
+from core.forecast_rollup import refresh_rollup_partitions, delete_rollup_weeks
+
+# Forecast attribute name -> table column name (class_description is stored as "class")
+FORECAST_COPY_COLUMNS = {
+    attribute.key: attribute.columns[0].name
+    for attribute in inspect(Forecast).column_attrs
+    if attribute.key != "id"
+}
+
+NUMERIC_COLUMNS = ['consensus_qty', 'forecast_qty', 'sold_qty', 'wom']
+
+STRING_COLUMNS = ['p1_dc', 'format', 'city', 'state', 'segment_code', 'brick_description',
+                  'brand', 'segment', 'division', 'brick_code', 'class_code', 'division_code',
+                  'vertical', 'store_no', 'batchno', 'status', 'article_id', 'month_year',
+                  'pin_code', 'region', 'family_code', 'class_description', 'sd', 'article_description', 'kvi', 'npi']
+
+# CSV column names that are read: the model's columns plus "class" (stored as class_description)
+CSV_COLUMNS = set(FORECAST_COPY_COLUMNS) | {'class'}
+
+# Rows per chunk read from a part file and copied to the database
+LOAD_CHUNK_ROWS = 50000
+CHECKSUM_BLOCK_BYTES = 1024 * 1024
+
+# Partitions handed to the pool ahead of the writer, per worker process, and prepared
+# chunks each of them may have waiting for the writer
+PARTITIONS_IN_FLIGHT_PER_WORKER = 2
+CHUNKS_IN_FLIGHT_PER_PARTITION = 2
+QUEUE_POLL_SECONDS = 1.0
+
+
+class ForecastFileError(Exception):
+    """A part file that could not be parsed; the message names the file"""
+
+
+def partition_key(partition):
+    return (partition["week_start_date"], partition["super_category"], partition["store_type"])
+
+
+async def fetch_manifest(postgres_db):
+    """Manifest rows of the loaded partitions, keyed by (week_start_date, super_category, store_type)"""
+    rows = await postgres_db.fetch_all(select(ForecastLoadManifest))
+    return {
+        (row["week_start_date"], row["super_category"], row["store_type"]): dict(row)
+        for row in rows
+    }
+
+
+def is_partition_unchanged(partition, manifest_entry):
+    """Cheap check on file sizes, mtimes and the _SUCCESS marker, without reading the files"""
+    return (
+        manifest_entry is not None
+        and manifest_entry["files"] == partition["files"]
+        and manifest_entry["success_marker"] == partition["success_marker"]
+    )
+
+
+class HashingReader:
+    """File wrapper that feeds everything read through it into a digest"""
+
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def update_file_digest(digest, path):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_BYTES), b""):
+            digest.update(block)
+
+
+def partition_checksum(partition):
+    """sha256 over the names and contents of a partition's part files, read in blocks"""
+    digest = hashlib.sha256()
+    for file_info in partition["files"]:
+        digest.update(Path(file_info["path"]).name.encode())
+        update_file_digest(digest, file_info["path"])
+    return digest.hexdigest()
+
+
+def is_forecast_csv_column(name):
+    return name in CSV_COLUMNS
+
+
+def prepare_forecast_chunk(df, week_start_date, super_category, store_type):
+    """
+    Coerce a chunk of a part file to the Forecast column types
+
+    Returns:
+        Tuple of (table column names, list of values per column)
+    """
+    # Add the metadata columns
+    df['week_start_date'] = week_start_date
+    df['super_category'] = super_category
+    df['store_type'] = store_type
+
+    # Ensure numeric columns are properly converted
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # Convert class column to class_description (since 'class' is a reserved keyword)
+    if 'class' in df.columns:
+        df = df.rename(columns={'class': 'class_description'})
+
+    # Make sure all values are strings, especially article_id. Missing values are stored
+    # as 'nan', which is what astype(str) has always made of the CSV reader's NaN; Parquet
+    # chunks have None for them instead.
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].where(df[col].notna(), 'nan').astype(str)
+
+    # tolist() yields native Python values, which asyncpg's binary encoders require
+    keys = list(df.columns)
+    return [FORECAST_COPY_COLUMNS[key] for key in keys], [df[key].tolist() for key in keys]
+
+
+def read_forecast_chunks(f, csv_file, partition, debug=False):
+    """
+    Read a part file in chunks of LOAD_CHUNK_ROWS rows, reading only the columns that map
+    to the Forecast model, and yield each chunk prepared for COPY
+    """
+    # String columns are read as text so every chunk gets the same values: with per-chunk
+    # type inference a code column could come out as 501401 in one chunk and 501401.0 in another
+    reader = pd.read_csv(
+        f,
+        usecols=is_forecast_csv_column,
+        dtype={col: str for col in STRING_COLUMNS + ['class']},
+        chunksize=LOAD_CHUNK_ROWS,
+    )
+    for chunk_index, df in enumerate(reader):
+        if debug and chunk_index == 0:
+            print(f"File {csv_file} loaded, columns: {df.columns.tolist()}")
+            print(f"Sample data types: {df.dtypes}")
+            if not df.empty:
+                print(f"Sample record: {df.iloc[0].to_dict()}")
+        if df.empty:
+            continue
+        yield prepare_forecast_chunk(
+            df,
+            partition["week_start_date"],
+            partition["super_category"],
+            partition["store_type"],
+        )
+
+
+def read_forecast_parquet_chunks(parquet_file, partition, debug=False):
+    """
+    Read a Parquet part file in batches of LOAD_CHUNK_ROWS rows, reading only the columns
+    that map to the Forecast model, and yield each chunk prepared for COPY
+    """
+    parquet = pq.ParquetFile(parquet_file)
+    columns = [name for name in parquet.schema_arrow.names if is_forecast_csv_column(name)]
+    for chunk_index, batch in enumerate(parquet.iter_batches(batch_size=LOAD_CHUNK_ROWS, columns=columns)):
+        df = batch.to_pandas()
+        if debug and chunk_index == 0:
+            print(f"File {parquet_file} loaded, columns: {df.columns.tolist()}")
+            print(f"Sample data types: {df.dtypes}")
+        if df.empty:
+            continue
+        yield prepare_forecast_chunk(
+            df,
+            partition["week_start_date"],
+            partition["super_category"],
+            partition["store_type"],
+        )
+
+
+def prepare_forecast_partition(partition, known_checksum, queue, debug=False):
+    """
+    Checksum and parse the part files of a partition in a worker process, sending the
+    prepared chunks to the writer through queue. Memory is bounded by the chunk size and
+    the queue size, not by the size of the files.
+
+    Messages put on the queue:
+    - ("chunk", columns, values) for every chunk
+    - ("unchanged", checksum) instead of chunks when the files still match known_checksum
+      (e.g. they were only touched)
+    - ("done", checksum) after the last chunk
+    - ("error", message) if a file could not be read
+    """
+    try:
+        if known_checksum is not None:
+            checksum = partition_checksum(partition)
+            if checksum == known_checksum:
+                queue.put(("unchanged", checksum))
+                return
+
+        # The checksum is computed while the files are parsed, so they are read only once
+        digest = hashlib.sha256()
+        for file_info in partition["files"]:
+            part_file = file_info["path"]
+            digest.update(Path(part_file).name.encode())
+            try:
+                if part_file.endswith(".parquet"):
+                    # Parquet is read by offset, so it is hashed in a separate pass
+                    update_file_digest(digest, part_file)
+                    for columns, values in read_forecast_parquet_chunks(part_file, partition, debug):
+                        queue.put(("chunk", columns, values))
+                    continue
+                with open(part_file, "rb") as f:
+                    for columns, values in read_forecast_chunks(HashingReader(f, digest), part_file, partition, debug):
+                        queue.put(("chunk", columns, values))
+            except pd.errors.EmptyDataError:
+                # A part file without even a header holds no rows
+                continue
+            except Exception as e:
+                queue.put(("error", f"Error processing file {part_file}: {str(e)}"))
+                return
+
+        queue.put(("done", digest.hexdigest()))
+    except Exception as e:
+        queue.put(("error", f"Error processing partition {partition['path']}: {str(e)}"))
+
+
+class PreparedPartition:
+    """Chunks of a partition streamed from its worker process"""
+
+    def __init__(self, partition, queue, future):
+        self.partition = partition
+        self.queue = queue
+        self.future = future
+        self.checksum = None
+        self.unchanged = False
+        self.finished = False
+        # Time spent waiting on the worker, i.e. parsing that the writer could not overlap
+        self.wait_seconds = 0.0
+        self._next_message = None
+
+    async def _get(self):
+        # The queue is a multiprocessing proxy; wait on it without blocking the event loop
+        started = time.perf_counter()
+        try:
+            return await self._wait_for_message()
+        finally:
+            self.wait_seconds += time.perf_counter() - started
+
+    async def _wait_for_message(self):
+        while True:
+            try:
+                message = await asyncio.to_thread(self.queue.get, True, QUEUE_POLL_SECONDS)
+                break
+            except queue.Empty:
+                # A worker process that died (e.g. killed for memory) never sends its last message
+                if self.future.done():
+                    # The worker may have put its last messages after the get timed out
+                    try:
+                        message = self.queue.get_nowait()
+                        break
+                    except queue.Empty:
+                        pass
+                    self.finished = True
+                    error = self.future.exception() or "worker exited without a result"
+                    return ("error", f"Error processing partition {self.partition['path']}: {error}")
+        if message[0] in ("done", "unchanged", "error"):
+            self.finished = True
+        return message
+
+    async def start(self):
+        """Wait for the worker's first message, which tells whether the partition is unchanged"""
+        self._next_message = await self._get()
+        if self._next_message[0] == "unchanged":
+            self.unchanged = True
+            self.checksum = self._next_message[1]
+
+    async def chunks(self, on_chunk=None):
+        """
+        Yield (columns, values) chunks; checksum is set once they are exhausted
+
+        Parameters:
+        - on_chunk: optional coroutine function called with the row count of each chunk
+
+        Raises ForecastFileError if the worker could not read a file
+        """
+        while True:
+            message = self._next_message or await self._get()
+            self._next_message = None
+            if message[0] == "chunk":
+                if on_chunk is not None:
+                    await on_chunk(len(message[2][0]) if message[2] else 0)
+                yield message[1], message[2]
+            elif message[0] == "done":
+                self.checksum = message[1]
+                return
+            elif message[0] == "error":
+                raise ForecastFileError(message[1])
+            else:
+                return
+
+    async def drain(self):
+        """Discard the remaining chunks so a worker blocked on the full queue can finish"""
+        while not self.finished:
+            await self._get()
+
+
+async def prepare_forecast_partitions(pending_partitions, workers=None, debug=False):
+    """
+    Prepare partitions in a process pool and yield them in order as their chunks start to arrive
+
+    Parameters:
+    - pending_partitions: list of (partition, known checksum or None)
+    - workers: number of worker processes (default: CPU count)
+
+    Yields:
+        PreparedPartition; its chunks must be consumed (or drained) before the next one is yielded
+    """
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    pending = iter(pending_partitions)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, Manager() as manager:
+        in_flight = deque()
+
+        def submit_next():
+            pending_partition = next(pending, None)
+            if pending_partition is None:
+                return
+            partition, known_checksum = pending_partition
+            chunk_queue = manager.Queue(maxsize=CHUNKS_IN_FLIGHT_PER_PARTITION)
+            future = loop.run_in_executor(pool, prepare_forecast_partition, partition, known_checksum, chunk_queue, debug)
+            in_flight.append((future, PreparedPartition(partition, chunk_queue, future)))
+
+        # Keep a bounded number of partitions parsed ahead of the writer so memory stays flat.
+        # Partitions are consumed in submission order, which is also the order the pool runs
+        # them in, so the writer always waits on a partition that is being worked on
+        for _ in range(workers * PARTITIONS_IN_FLIGHT_PER_WORKER):
+            submit_next()
+
+        while in_flight:
+            future, prepared_partition = in_flight.popleft()
+            try:
+                await prepared_partition.start()
+                yield prepared_partition
+            finally:
+                await prepared_partition.drain()
+                await asyncio.gather(future, return_exceptions=True)
+            submit_next()
+
+
+def manifest_values(partition, checksum, row_count):
+    return {
+        "week_start_date": partition["week_start_date"],
+        "super_category": partition["super_category"],
+        "store_type": partition["store_type"],
+        "partition_path": partition["path"],
+        "files": partition["files"],
+        "file_size": sum(file_info["size"] for file_info in partition["files"]),
+        "file_mtime": max(file_info["mtime"] for file_info in partition["files"]),
+        "checksum": checksum,
+        "success_marker": partition["success_marker"],
+        "row_count": row_count,
+    }
+
+
+def upsert_manifest_statement(values):
+    statement = insert(ForecastLoadManifest).values(**values)
+    return statement.on_conflict_do_update(
+        constraint="uq_forecast_load_manifest_partition",
+        set_={key: statement.excluded[key] for key in values if key not in ("week_start_date", "super_category", "store_type")},
+    )
+
+
+async def copy_forecast_chunks(connection, table_name, chunks):
+    """
+    COPY prepared chunks into a table with asyncpg's binary COPY, one chunk at a time
+
+    Returns:
+        Number of rows copied
+    """
+    row_count = 0
+    async for columns, values in chunks:
+        status = await connection.raw_connection.copy_records_to_table(
+            table_name,
+            records=zip(*values),
+            columns=columns,
+        )
+        # asyncpg returns the command status, e.g. "COPY 1000"
+        row_count += int(status.split()[-1])
+    return row_count
+
+
+async def replace_forecast_partition(postgres_db, prepared_partition, on_chunk=None):
+    """
+    Replace a partition's forecast rows with its prepared chunks, and record it in the manifest
+
+    The delete, copy, manifest update and the partition's rollup rows run in one
+    transaction, so a partition is either replaced completely or left as it was. On a
+    partitioned forecast table the delete only touches the week's partition.
+
+    Returns:
+        Number of rows copied
+    """
+    partition = prepared_partition.partition
+    week_start_date, super_category, store_type = partition_key(partition)
+
+    async with postgres_db.connection() as connection:
+        async with connection.transaction():
+            await connection.execute(
+                delete(Forecast).where(
+                    Forecast.week_start_date == week_start_date,
+                    Forecast.super_category == super_category,
+                    Forecast.store_type == store_type,
+                )
+            )
+            row_count = await copy_forecast_chunks(
+                connection, Forecast.__tablename__, prepared_partition.chunks(on_chunk)
+            )
+            await connection.execute(
+                upsert_manifest_statement(manifest_values(partition, prepared_partition.checksum, row_count))
+            )
+            await refresh_rollup_partitions(connection, [partition_key(partition)])
+
+    return row_count
+
+
+async def stage_forecast_partition(postgres_db, staging_table, prepared_partition, on_chunk=None):
+    """
+    COPY a partition of a new week into the week's standalone staging table. It is recorded
+    in the manifest when the week is attached.
+
+    Returns:
+        Number of rows copied
+    """
+    async with postgres_db.connection() as connection:
+        async with connection.transaction():
+            return await copy_forecast_chunks(connection, staging_table, prepared_partition.chunks(on_chunk))
+
+
+async def attach_forecast_week(postgres_db, week_start_date, staged_partitions):
+    """
+    Attach a loaded staging table as the week's partition, record its partitions in the
+    manifest and compute their rollup rows, in one transaction
+
+    Parameters:
+    - staged_partitions: list of (partition, checksum, row count) copied into the staging table
+    """
+    async with postgres_db.connection() as connection:
+        async with connection.transaction():
+            # The week has no partition yet, so this only touches rows other writers left in
+            # the default partition; the rest of the week's rows move into the staging table
+            await connection.execute(
+                delete(Forecast).where(
+                    Forecast.week_start_date == week_start_date,
+                    tuple_(Forecast.super_category, Forecast.store_type).in_(
+                        [(partition["super_category"], partition["store_type"]) for partition, _, _ in staged_partitions]
+                    ),
+                )
+            )
+            await attach_week_partition(connection, Forecast.__tablename__, week_start_date)
+            for partition, checksum, row_count in staged_partitions:
+                await connection.execute(upsert_manifest_statement(manifest_values(partition, checksum, row_count)))
+            await refresh_rollup_partitions(connection, [partition_key(partition) for partition, _, _ in staged_partitions])
+
+
+async def drop_forecast_week(postgres_db, week_start_date):
+    """
+    Remove a week of forecast data, its manifest entries and its rollup rows. On a partitioned table this
+    drops the week's partition instead of deleting its rows.
+    """
+    async with postgres_db.transaction():
+        if await is_partitioned(postgres_db, Forecast.__tablename__):
+            await drop_week_partitions(postgres_db, Forecast.__tablename__, [week_start_date])
+        # Rows of the week may also sit in the default partition (or a plain table)
+        await postgres_db.execute(delete(Forecast).where(Forecast.week_start_date == week_start_date))
+        await postgres_db.execute(
+            delete(ForecastLoadManifest).where(ForecastLoadManifest.week_start_date == week_start_date)
+        )
+        await delete_rollup_weeks(postgres_db, [week_start_date])
+
+
+async def fetch_load_generation(postgres_db):
+    """
+    Value that changes whenever forecast rows are loaded or deleted, as seen by every
+    worker: loads and deletes rewrite the manifest in the transaction that changes the rows
+    """
+    row = await postgres_db.fetch_one(
+        select(func.count().label("partitions"), func.max(ForecastLoadManifest.loaded_at).label("loaded_at"))
+    )
+    return (row["partitions"], row["loaded_at"])
+
+
+async def touch_manifest_partition(postgres_db, partition, manifest_entry):
+    """Record new file stats for a partition whose contents did not change"""
+    values = manifest_values(partition, manifest_entry["checksum"], manifest_entry["row_count"])
+    await postgres_db.execute(upsert_manifest_statement(values))
+
+
+async def clear_manifest(postgres_db):
+    await postgres_db.execute(f"TRUNCATE TABLE {ForecastLoadManifest.__tablename__}")
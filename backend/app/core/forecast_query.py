@@ -0,0 +1,655 @@
+"""
+Query building for GET /core/forecast.
+
+A request is parsed into a ForecastQuerySpec: a hashable shape (which columns are
+selected, filtered, searched and sorted, and how) plus the bind values. SQL is
+compiled once per shape and kept in an LRU cache, so the handful of filter shapes the
+dashboard repeats skip SQLAlchemy expression building and compilation, and asyncpg
+reuses its prepared statement for the identical SQL text.
+"""
+
+from functools import lru_cache
+from datetime import datetime, date
+import base64
+import json
+
+import pyarrow as pa
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, or_, and_, asc, desc, any_, bindparam, case, tuple_, true, false, literal_column, Integer, ARRAY
+from sqlalchemy.dialects.postgresql import asyncpg as postgresql_asyncpg
+from sqlalchemy.inspection import inspect
+
+from schema import Forecast, ForecastRollup
+from core.forecast_rollup import rollup_covers
+
+FORECAST_FIELDS = inspect(Forecast).column_attrs.keys()
+PLAN_CACHE_SIZE = 512
+LIKE_ESCAPE = "!"
+# Text and date columns the accuracy metrics can be grouped by
+METRIC_GROUP_FIELDS = [
+    field for field in FORECAST_FIELDS
+    if getattr(Forecast, field).type.python_type in (str, date)
+]
+ARROW_TYPES = {int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_(), date: pa.date32()}
+
+_dialect = postgresql_asyncpg.dialect()
+
+
+class ForecastQuerySpec:
+    def __init__(self):
+        self.fields = None
+        self.conditions = []
+        self.sort_field = None
+        self.sort_direction = "asc"
+        self.params = {}
+
+    def add_param(self, value):
+        name = f"p{len(self.params)}"
+        self.params[name] = value
+        return name
+
+    @property
+    def shape(self):
+        return (self.fields, tuple(self.conditions), self.sort_field, self.sort_direction)
+
+    @property
+    def count_key(self):
+        """Normalized filter set, used to cache total counts"""
+        return json.dumps([self.conditions, sorted(self.params.items())], default=str)
+
+    @property
+    def sort_column(self):
+        return getattr(Forecast, self.sort_field) if self.sort_field else None
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_json_param(value, name):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON in {name} parameter")
+
+
+def escape_like(value):
+    """Escape LIKE wildcards so search terms are matched literally"""
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+def parse_fields(fields):
+    """
+    Parse the comma-separated fields parameter into Forecast attribute names.
+    id is always selected first so rows stay addressable and cursors can be built.
+    """
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    invalid_fields = [field for field in requested if field not in FORECAST_FIELDS]
+    if invalid_fields:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid_fields)}")
+
+    return ("id",) + tuple(field for field in requested if field != "id")
+
+
+def parse_forecast_spec(
+    week_start_date=None,
+    super_category=None,
+    store_type=None,
+    fields=None,
+    search=None,
+    search_mode="contains",
+    filters=None,
+    sort=None,
+):
+    """
+    Parse the forecast listing parameters into a ForecastQuerySpec
+
+    Parameters:
+    - search: JSON object of field -> value, ORed together. Strings match case-insensitively
+      anywhere in the field ("contains") or at its start ("prefix"); other values match exactly
+    - filters: JSON object of field -> {"type":"range","min":..,"max":..} or {"type":"discrete","values":[..]}
+    - sort: JSON object {"field":..,"direction":"asc|desc"}
+    Unknown fields in search, filters and sort are ignored.
+    """
+    spec = ForecastQuerySpec()
+
+    if fields:
+        spec.fields = parse_fields(fields)
+
+    if week_start_date:
+        try:
+            date_obj = parse_date(week_start_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        spec.conditions.append(("eq", "week_start_date", spec.add_param(date_obj)))
+
+    if super_category:
+        spec.conditions.append(("eq", "super_category", spec.add_param(super_category)))
+
+    if store_type:
+        spec.conditions.append(("eq", "store_type", spec.add_param(store_type)))
+
+    if search:
+        search_criteria = parse_json_param(search, "search")
+        search_conditions = []
+        for field, value in search_criteria.items():
+            if field not in FORECAST_FIELDS:
+                continue
+            if isinstance(value, str):
+                pattern = escape_like(value) + "%"
+                if search_mode != "prefix":
+                    pattern = "%" + pattern
+                search_conditions.append(("ilike", field, spec.add_param(pattern)))
+            else:
+                search_conditions.append(("eq", field, spec.add_param(value)))
+        if search_conditions:
+            spec.conditions.append(("or", tuple(search_conditions)))
+
+    if filters:
+        filter_criteria = parse_json_param(filters, "filters")
+        for field, filter_spec in filter_criteria.items():
+            if field not in FORECAST_FIELDS or not isinstance(filter_spec, dict):
+                continue
+
+            if filter_spec.get("type") == "range":
+                min_val = filter_spec.get("min")
+                max_val = filter_spec.get("max")
+                if min_val is not None:
+                    spec.conditions.append(("gte", field, spec.add_param(min_val)))
+                if max_val is not None:
+                    spec.conditions.append(("lte", field, spec.add_param(max_val)))
+
+            elif filter_spec.get("type") == "discrete":
+                values = filter_spec.get("values", [])
+                if field == "week_start_date":
+                    date_values = []
+                    for date_str in values:
+                        try:
+                            date_values.append(parse_date(date_str))
+                        except (ValueError, TypeError):
+                            # Skip invalid dates
+                            pass
+                    values = date_values
+                if values:
+                    spec.conditions.append(("any", field, spec.add_param(list(values))))
+
+    if sort:
+        sort_criteria = parse_json_param(sort, "sort")
+        sort_field = sort_criteria.get("field")
+        spec.sort_direction = "desc" if sort_criteria.get("direction", "asc") == "desc" else "asc"
+        if sort_field in FORECAST_FIELDS:
+            spec.sort_field = sort_field
+
+    return spec
+
+
+def condition_clause(condition, params=None, model=Forecast):
+    """
+    Build the SQLAlchemy expression for one condition shape on model's columns. Without
+    params the bind parameters are left empty so the statement can be compiled once and reused.
+    """
+    op = condition[0]
+    if op == "or":
+        return or_(*[condition_clause(sub_condition, params, model) for sub_condition in condition[1]])
+
+    _, field, name = condition
+    column = getattr(model, field)
+    value_kwargs = {"value": params[name]} if params is not None else {}
+
+    if op == "any":
+        return column == any_(bindparam(name, type_=ARRAY(column.type), **value_kwargs))
+
+    param = bindparam(name, type_=column.type, **value_kwargs)
+    if op == "eq":
+        return column == param
+    if op == "gte":
+        return column >= param
+    if op == "lte":
+        return column <= param
+    if op == "ilike":
+        return column.ilike(param, escape=LIKE_ESCAPE)
+    raise ValueError(f"Unknown condition {op}")
+
+
+def keyset_condition(sort_column, sort_direction, last_value_is_null):
+    """
+    Build the condition selecting rows that come after the cursor row in
+    ORDER BY sort_column, id. Postgres sorts NULLs last for ASC and first for DESC.
+    """
+    last_id = bindparam("cursor_id", type_=Forecast.id.type)
+    if sort_column is None:
+        return Forecast.id < last_id if sort_direction == "desc" else Forecast.id > last_id
+
+    last_value = bindparam("cursor_value", type_=sort_column.type)
+    if sort_direction == "desc":
+        if last_value_is_null:
+            return or_(sort_column.isnot(None), and_(sort_column.is_(None), Forecast.id < last_id))
+        return or_(sort_column < last_value, and_(sort_column == last_value, Forecast.id < last_id))
+
+    if last_value_is_null:
+        return and_(sort_column.is_(None), Forecast.id > last_id)
+    return or_(
+        sort_column > last_value,
+        and_(sort_column == last_value, Forecast.id > last_id),
+        sort_column.is_(None),
+    )
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_forecast_plan(shape, kind):
+    """
+    Compile the statement for a spec shape
+
+    Parameters:
+    - kind: "all" (every row), "page" (OFFSET/LIMIT), "cursor" / "cursor_null" (keyset after
+      a non-null / null sort value), "count", or "explain" (planner estimate of the matching rows)
+
+    Returns:
+        Tuple of (sql, bind parameter names in positional order, result column names)
+    """
+    fields, conditions, sort_field, sort_direction = shape
+    where = [condition_clause(condition) for condition in conditions]
+
+    if kind == "count":
+        statement = select(func.count()).select_from(Forecast.__table__).where(*where)
+    elif kind == "explain":
+        statement = select(Forecast.id).where(*where)
+    else:
+        sort_column = getattr(Forecast, sort_field) if sort_field else None
+        if fields:
+            columns = [getattr(Forecast, field) for field in fields]
+            # The cursor needs the sort value even when it was not requested
+            if sort_field and sort_field not in fields:
+                columns.append(sort_column)
+            statement = select(*columns)
+        else:
+            statement = select(Forecast.__table__)
+        statement = statement.where(*where)
+
+        order = desc if sort_direction == "desc" else asc
+        if sort_column is not None:
+            statement = statement.order_by(order(sort_column))
+        # Break ties on id so every row has a stable position for cursor pagination
+        statement = statement.order_by(order(Forecast.id))
+
+        if kind in ("cursor", "cursor_null"):
+            statement = statement.where(keyset_condition(sort_column, sort_direction, kind == "cursor_null"))
+        elif kind == "page":
+            statement = statement.offset(bindparam("offset"))
+        if kind != "all":
+            statement = statement.limit(bindparam("limit"))
+
+    compiled = statement.compile(dialect=_dialect, compile_kwargs={"render_postcompile": True})
+    sql = str(compiled)
+    if kind == "explain":
+        sql = "EXPLAIN (FORMAT JSON) " + sql
+    columns = [column.name for column in statement.selected_columns]
+    return sql, tuple(compiled.positiontup or ()), columns
+
+
+def split_facet_conditions(conditions, facet_fields):
+    """
+    Split filter conditions into the ones on each facet field, which are dropped when that
+    field's own counts are computed, and the ones always applied (search, filters on other fields)
+
+    Returns:
+        Tuple of ({facet field: [conditions]}, [conditions])
+    """
+    field_conditions = {}
+    common_conditions = []
+    for condition in conditions:
+        if condition[0] != "or" and condition[1] in facet_fields:
+            field_conditions.setdefault(condition[1], []).append(condition)
+        else:
+            common_conditions.append(condition)
+    return field_conditions, common_conditions
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_facet_plan(conditions, facet_fields, limited_fields):
+    """
+    Compile the facet count statement for a set of conditions, in one scan of the table
+
+    Each facet field is a grouping set. A field's values are counted over the rows matching
+    every condition except the field's own, so picking a value does not hide its siblings.
+    Rows failing more than one facet field's conditions can't count anywhere and are
+    filtered out first. NULL values are not counted. The empty grouping set gives the total
+    of fully matching rows.
+
+    Parameters:
+    - conditions: condition shapes of a ForecastQuerySpec
+    - facet_fields: fields to count values of
+    - limited_fields: fields with their own top-K bind parameter (top_k_<field>); the
+      others use top_k
+
+    Returns:
+        Tuple of (sql, bind parameter names in positional order, result column names).
+        Rows have grouping_id, the facet columns, count, distinct_values and rank.
+    """
+    field_conditions, common_conditions = split_facet_conditions(conditions, facet_fields)
+    facet_columns = [getattr(Forecast, field) for field in facet_fields]
+    all_grouped = (1 << len(facet_fields)) - 1
+
+    def grouping_id_of(field):
+        return literal_column(str(all_grouped ^ (1 << (len(facet_fields) - 1 - facet_fields.index(field)))))
+
+    # Constants are rendered inline so the plan's bind parameters are only the spec's
+    zero, one = literal_column("0"), literal_column("1")
+
+    # Whether a row passes each filtered facet field's own conditions (NULL counts as no)
+    passes = {
+        field: func.coalesce(and_(*[condition_clause(condition) for condition in field_conditions[field]]), false())
+        for field in facet_fields if field in field_conditions
+    }
+    where = [condition_clause(condition) for condition in common_conditions]
+    if passes:
+        failures = sum((case((passed, zero), else_=one) for passed in passes.values()), zero)
+        where.append(failures <= one)
+
+    count_columns = [func.count().filter(and_(true(), *passes.values())).label("count_all")]
+    for field in passes:
+        others = [passed for other, passed in passes.items() if other != field]
+        count_columns.append(func.count().filter(and_(true(), *others)).label(f"count_except_{field}"))
+
+    grouped = (
+        select(func.grouping(*facet_columns).label("grouping_id"), *facet_columns, *count_columns)
+        .where(*where)
+        .group_by(func.grouping_sets(*(tuple_(column) for column in facet_columns), tuple_()))
+        .subquery("grouped")
+    )
+
+    facet_count = case(
+        *((grouped.c.grouping_id == grouping_id_of(field), grouped.c[f"count_except_{field}"]) for field in passes),
+        else_=grouped.c.count_all,
+    ) if passes else grouped.c.count_all
+    counted = (
+        select(grouped.c.grouping_id, *(grouped.c[column.name] for column in facet_columns), facet_count.label("count"))
+        .where(or_(
+            # NULL isn't a facet value, so it takes no top-K slot and isn't in distinct_values
+            and_(facet_count > zero, or_(*(
+                and_(grouped.c.grouping_id == grouping_id_of(field), grouped.c[column.name].isnot(None))
+                for field, column in zip(facet_fields, facet_columns)
+            ))),
+            grouped.c.grouping_id == literal_column(str(all_grouped)),
+        ))
+        .subquery("counted")
+    )
+
+    ranked = select(
+        counted,
+        func.row_number().over(
+            partition_by=counted.c.grouping_id,
+            order_by=[counted.c["count"].desc(), *(counted.c[column.name] for column in facet_columns)],
+        ).label("rank"),
+        func.count().over(partition_by=counted.c.grouping_id).label("distinct_values"),
+    ).subquery("ranked")
+
+    top_k = case(
+        *((ranked.c.grouping_id == grouping_id_of(field), bindparam(f"top_k_{field}", type_=Integer)) for field in limited_fields),
+        else_=bindparam("top_k", type_=Integer),
+    ) if limited_fields else bindparam("top_k", type_=Integer)
+    statement = (
+        select(ranked)
+        .where(ranked.c.rank <= top_k)
+        .order_by(ranked.c.grouping_id, ranked.c.rank)
+    )
+
+    compiled = statement.compile(dialect=_dialect, compile_kwargs={"render_postcompile": True})
+    columns = [column.name for column in statement.selected_columns]
+    return str(compiled), tuple(compiled.positiontup or ()), columns
+
+
+def collect_facets(rows, facet_fields):
+    """
+    Build the facets response from the rows of a facet plan
+
+    Returns:
+        Tuple of (total matching rows, {field: {"values": [{"value", "count"}], "distinct_values": n}})
+    """
+    all_grouped = (1 << len(facet_fields)) - 1
+    field_by_grouping_id = {
+        all_grouped ^ (1 << (len(facet_fields) - 1 - position)): field
+        for position, field in enumerate(facet_fields)
+    }
+    column_names = {field: getattr(Forecast, field).expression.name for field in facet_fields}
+
+    total = 0
+    facets = {field: {"values": [], "distinct_values": 0} for field in facet_fields}
+    for row in rows:
+        if row["grouping_id"] == all_grouped:
+            total = row["count"]
+            continue
+        field = field_by_grouping_id[row["grouping_id"]]
+        value = row[column_names[field]]
+        facets[field]["distinct_values"] = row["distinct_values"]
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        facets[field]["values"].append({"value": value, "count": row["count"]})
+    return total, facets
+
+
+def metric_columns(totals):
+    """
+    Accuracy metrics of the model (forecast_qty) and baseline (consensus_qty) forecasts
+    against sold_qty, from aggregate expressions: sold, predicted, baseline (quantity sums),
+    model_absolute_error, baseline_absolute_error (sums) and model_mse, baseline_mse
+    """
+    zero, hundred = literal_column("0"), literal_column("100")
+    total_sold = totals["sold"]
+    return [
+        # Sum of absolute difference of the quantity sold and predicted quantity
+        totals["model_absolute_error"].label("model_absolute_error"),
+        totals["baseline_absolute_error"].label("baseline_absolute_error"),
+        case((total_sold == zero, zero), else_=totals["model_absolute_error"] * hundred / total_sold).label("model_percentage_error"),
+        case((total_sold == zero, zero), else_=totals["baseline_absolute_error"] * hundred / total_sold).label("baseline_percentage_error"),
+        func.sqrt(totals["model_mse"]).label("model_rmse"),
+        func.sqrt(totals["baseline_mse"]).label("baseline_rmse"),
+        total_sold.label("total_qty_sold"),
+        totals["predicted"].label("total_qty_predicted"),
+        totals["baseline"].label("total_qty_baseline"),
+    ]
+
+
+def forecast_metric_totals():
+    two = literal_column("2")
+    model_error = Forecast.sold_qty - Forecast.forecast_qty
+    baseline_error = Forecast.sold_qty - Forecast.consensus_qty
+    return {
+        "sold": func.sum(Forecast.sold_qty),
+        "predicted": func.sum(Forecast.forecast_qty),
+        "baseline": func.sum(Forecast.consensus_qty),
+        "model_absolute_error": func.sum(func.abs(model_error)),
+        "baseline_absolute_error": func.sum(func.abs(baseline_error)),
+        "model_mse": func.avg(func.pow(model_error, two)),
+        "baseline_mse": func.avg(func.pow(baseline_error, two)),
+    }
+
+
+def rollup_metric_totals():
+    zero = literal_column("0")
+    return {
+        "sold": func.sum(ForecastRollup.sold_qty_sum),
+        "predicted": func.sum(ForecastRollup.forecast_qty_sum),
+        "baseline": func.sum(ForecastRollup.consensus_qty_sum),
+        "model_absolute_error": func.sum(ForecastRollup.model_absolute_error),
+        "baseline_absolute_error": func.sum(ForecastRollup.baseline_absolute_error),
+        "model_mse": func.sum(ForecastRollup.model_squared_error) / func.nullif(func.sum(ForecastRollup.model_error_rows), zero),
+        "baseline_mse": func.sum(ForecastRollup.baseline_squared_error) / func.nullif(func.sum(ForecastRollup.baseline_error_rows), zero),
+    }
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_metrics_plan(conditions, group_fields):
+    """
+    Compile the accuracy metrics statement for a set of conditions
+
+    With group_fields, one aggregate pass returns a row per group plus the overall row
+    (GROUPING SETS ((group_fields), ())), told apart by grouping_id; the overall row has
+    every bit set. When the conditions and groups only use rollup dimensions the statement
+    reads forecast_rollup instead of forecast.
+
+    Returns:
+        Tuple of (sql, bind parameter names in positional order, result column names)
+    """
+    if rollup_covers(conditions, group_fields):
+        model, metrics = ForecastRollup, metric_columns(rollup_metric_totals())
+    else:
+        model, metrics = Forecast, metric_columns(forecast_metric_totals())
+    where = [condition_clause(condition, model=model) for condition in conditions]
+
+    if not group_fields:
+        statement = select(*metrics).select_from(model.__table__).where(*where)
+    else:
+        group_columns = [getattr(model, field) for field in group_fields]
+        statement = (
+            select(
+                func.grouping(*group_columns).label("grouping_id"),
+                *(column.label(field) for field, column in zip(group_fields, group_columns)),
+                *metrics,
+            )
+            .where(*where)
+            .group_by(func.grouping_sets(tuple_(*group_columns), tuple_()))
+            .order_by(*group_columns)
+        )
+
+    compiled = statement.compile(dialect=_dialect, compile_kwargs={"render_postcompile": True})
+    columns = [column.name for column in statement.selected_columns]
+    return str(compiled), tuple(compiled.positiontup or ()), columns
+
+
+def bias_columns(totals):
+    """Total over- (positive) or under-forecast of the model and baseline, and as a percentage of sold_qty"""
+    zero, hundred = literal_column("0"), literal_column("100")
+    total_sold = totals["sold"]
+    model_bias = totals["predicted"] - total_sold
+    baseline_bias = totals["baseline"] - total_sold
+    return [
+        model_bias.label("model_bias"),
+        baseline_bias.label("baseline_bias"),
+        case((total_sold == zero, zero), else_=model_bias * hundred / total_sold).label("model_bias_percentage"),
+        case((total_sold == zero, zero), else_=baseline_bias * hundred / total_sold).label("baseline_bias_percentage"),
+    ]
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_timeseries_plan(conditions, group_fields, deltas):
+    """
+    Compile the weekly accuracy statement: the metrics and bias per week_start_date (and
+    group), ordered by group and week. With deltas, lag() windows over each group's weeks
+    add <metric>_change, the change from the previous week with data (NULL for the first).
+    Reads forecast_rollup when the conditions and groups only use rollup dimensions.
+
+    Returns:
+        Tuple of (sql, bind parameter names in positional order, result column names)
+    """
+    if rollup_covers(conditions, ("week_start_date",) + group_fields):
+        model, totals = ForecastRollup, rollup_metric_totals()
+    else:
+        model, totals = Forecast, forecast_metric_totals()
+    where = [condition_clause(condition, model=model) for condition in conditions]
+    key_columns = [model.week_start_date] + [getattr(model, field) for field in group_fields]
+    metrics = metric_columns(totals) + bias_columns(totals)
+
+    statement = (
+        select(
+            *(column.label(field) for field, column in zip(("week_start_date",) + group_fields, key_columns)),
+            *metrics,
+        )
+        .where(*where)
+        .group_by(*key_columns)
+    )
+    if deltas:
+        weekly = statement.subquery("weekly")
+        previous_week = dict(
+            partition_by=[weekly.c[field] for field in group_fields] or None,
+            order_by=weekly.c.week_start_date,
+        )
+        statement = select(
+            weekly,
+            *(
+                (weekly.c[metric.name] - func.lag(weekly.c[metric.name]).over(**previous_week)).label(f"{metric.name}_change")
+                for metric in metrics
+            ),
+        ).order_by(*(weekly.c[field] for field in group_fields), weekly.c.week_start_date)
+    else:
+        statement = statement.order_by(*key_columns[1:], key_columns[0])
+
+    compiled = statement.compile(dialect=_dialect, compile_kwargs={"render_postcompile": True})
+    columns = [column.name for column in statement.selected_columns]
+    return str(compiled), tuple(compiled.positiontup or ()), columns
+
+
+def arrow_schema(column_names):
+    """Arrow schema for forecast table columns, so empty and all-null results keep their types"""
+    fields = []
+    for name in column_names:
+        python_type = Forecast.__table__.c[name].type.python_type
+        if python_type is datetime:
+            arrow_type = pa.timestamp("us", tz="UTC")
+        else:
+            arrow_type = ARROW_TYPES.get(python_type, pa.string())
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def plan_args(plan, params):
+    return [params[name] for name in plan[1]]
+
+
+async def fetch_plan(postgres_db, plan, params, method="fetch"):
+    """Run a compiled plan on a pooled connection with asyncpg (fetch, fetchrow or fetchval)"""
+    async with postgres_db.connection() as connection:
+        raw_connection = connection.raw_connection
+        return await getattr(raw_connection, method)(plan[0], *plan_args(plan, params))
+
+
+async def iterate_plan(postgres_db, plan, params, prefetch):
+    """Iterate over a compiled plan's rows through a server-side cursor"""
+    async with postgres_db.connection() as connection:
+        raw_connection = connection.raw_connection
+        async with raw_connection.transaction():
+            async for row in raw_connection.cursor(plan[0], *plan_args(plan, params), prefetch=prefetch):
+                yield row
+
+
+def encode_cursor(row, spec):
+    """Encode the sort key and id of the last row of a page into an opaque cursor"""
+    sort_column = spec.sort_column
+    value = row[sort_column.expression.name] if sort_column is not None else None
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    payload = {"f": spec.sort_field, "d": spec.sort_direction, "v": value, "id": row["id"]}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, spec):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Returns:
+        Tuple of (last sort value, last id)
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_value = payload["v"]
+        last_id = int(payload["id"])
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # A cursor is only meaningful for the ordering it was created with
+    if payload.get("f") != spec.sort_field or payload.get("d") != spec.sort_direction:
+        raise HTTPException(status_code=400, detail="Cursor does not match the sort parameter")
+
+    sort_column = spec.sort_column
+    if sort_column is not None and isinstance(last_value, str):
+        python_type = sort_column.type.python_type
+        try:
+            if python_type is datetime:
+                last_value = datetime.fromisoformat(last_value)
+            elif python_type is date:
+                last_value = date.fromisoformat(last_value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return last_value, last_id
@@ -0,0 +1,100 @@
+"""
+Pre-aggregated rollup of the forecast table.
+
+forecast_rollup holds one row per week_start_date x region x state x super_category x
+segment x brand x store_type with the row count, the quantity sums and the model and
+baseline error components. Aggregates that only filter and group on those columns, like
+the accuracy metrics, are answered from it instead of the fact table (see rollup_covers).
+
+Its grain includes the loader's partition key (week_start_date, super_category,
+store_type), so a load refreshes only the rollup rows of the partitions it replaced, in
+the transaction that replaces them; clearing the table or deleting a week removes the
+matching rollup rows in the same transaction.
+"""
+
+from sqlalchemy import select, func, delete, insert, tuple_, text
+
+from schema import Forecast, ForecastRollup
+
+ROLLUP_DIMENSIONS = ["week_start_date", "region", "state", "super_category", "segment", "brand", "store_type"]
+
+# Quantities summed into the rollup
+ROLLUP_SUMS = {
+    "forecast_qty_sum": Forecast.forecast_qty,
+    "consensus_qty_sum": Forecast.consensus_qty,
+    "sold_qty_sum": Forecast.sold_qty,
+}
+
+
+def rollup_covers(conditions, group_fields=()):
+    """
+    Whether an aggregate with these conditions (ForecastQuerySpec condition shapes) and
+    group fields can be answered from the rollup: every condition and group is on a
+    rollup dimension, so it selects whole rollup rows
+    """
+    for condition in conditions:
+        if condition[0] == "or":
+            if not rollup_covers(condition[1]):
+                return False
+        elif condition[1] not in ROLLUP_DIMENSIONS:
+            return False
+    return all(field in ROLLUP_DIMENSIONS for field in group_fields)
+
+
+def rollup_select(*where):
+    """Aggregate the forecast rows matching where to the rollup grain"""
+    dimensions = [getattr(Forecast, field) for field in ROLLUP_DIMENSIONS]
+    model_error = Forecast.sold_qty - Forecast.forecast_qty
+    baseline_error = Forecast.sold_qty - Forecast.consensus_qty
+    return (
+        select(
+            *dimensions,
+            func.count().label("row_count"),
+            *(func.sum(column).label(name) for name, column in ROLLUP_SUMS.items()),
+            func.sum(func.abs(model_error)).label("model_absolute_error"),
+            func.sum(func.abs(baseline_error)).label("baseline_absolute_error"),
+            func.sum(model_error * model_error).label("model_squared_error"),
+            func.sum(baseline_error * baseline_error).label("baseline_squared_error"),
+            func.count(model_error).label("model_error_rows"),
+            func.count(baseline_error).label("baseline_error_rows"),
+        )
+        .where(*where)
+        .group_by(*dimensions)
+    )
+
+
+def rollup_insert(*where):
+    statement = rollup_select(*where)
+    return insert(ForecastRollup).from_select([column.name for column in statement.selected_columns], statement)
+
+
+async def refresh_rollup_partitions(connection, partition_keys):
+    """
+    Recompute the rollup rows of loaded partitions. Run it on the connection and in the
+    transaction that replaced the partitions' rows, so the rollup commits with them.
+
+    Parameters:
+    - partition_keys: (week_start_date, super_category, store_type) tuples
+    """
+    partition_keys = list(partition_keys)
+    if not partition_keys:
+        return
+    rollup_key = tuple_(ForecastRollup.week_start_date, ForecastRollup.super_category, ForecastRollup.store_type)
+    forecast_key = tuple_(Forecast.week_start_date, Forecast.super_category, Forecast.store_type)
+    await connection.execute(delete(ForecastRollup).where(rollup_key.in_(partition_keys)))
+    await connection.execute(rollup_insert(forecast_key.in_(partition_keys)))
+
+
+async def delete_rollup_weeks(database, weeks=None):
+    """Remove the rollup rows of deleted weeks (default: all of them), in the caller's transaction"""
+    if weeks is None:
+        await database.execute(text(f"TRUNCATE TABLE {ForecastRollup.__tablename__}"))
+    else:
+        await database.execute(delete(ForecastRollup).where(ForecastRollup.week_start_date.in_(list(weeks))))
+
+
+async def rebuild_rollup(database):
+    """Recompute the whole rollup from the forecast table, e.g. to repair it (POST /core/forecast/rollup/rebuild)"""
+    async with database.transaction():
+        await database.execute(text(f"TRUNCATE TABLE {ForecastRollup.__tablename__}"))
+        await database.execute(rollup_insert())
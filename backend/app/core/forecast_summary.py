@@ -0,0 +1,194 @@
+"""
+Filter options and stats summaries of the forecast tables.
+
+GET /core/forecast/filters and /core/forecast/stats only change when data is loaded
+or deleted, so they are answered from a materialized view per summarized table,
+{table}_filter_summary, holding the value counts of every filter field and the bounds
+of the range fields: a few hundred rows instead of the whole table. The ingest endpoints
+refresh the views when they finish.
+"""
+
+from datetime import date
+
+from sqlalchemy import select, func, text, tuple_, table, column
+from sqlalchemy.dialects import postgresql
+
+from schema import Forecast
+
+# Tables with a filter summary, i.e. the ones /forecast/filters and /forecast/stats read
+SUMMARY_MODELS = [Forecast]
+
+# Fields of the /forecast/filters response
+FILTER_CATEGORICAL_FIELDS = [
+    "p1_dc", "format", "city", "state", "segment_code", "brick_description",
+    "brand", "segment", "division", "brick_code", "class_code", "division_code",
+    "vertical", "status", "month_year", "region", "family_code", "super_category",
+    "store_type"
+]
+FILTER_RANGE_FIELDS = ["forecast_qty", "consensus_qty", "sold_qty", "wom"]
+FILTER_DATE_FIELDS = ["week_start_date"]
+
+
+def filter_options_query(model):
+    """
+    One aggregate pass computing the value counts of every categorical and date field
+    (a grouping set per field) and the min/max of the range fields (the empty grouping set)
+
+    Returns:
+        (query, grouped fields). The grouping_id column tells which grouping set a row
+        belongs to: its bit for the grouped field is 0, the other bits are 1.
+    """
+    grouped_fields = [
+        field for field in FILTER_CATEGORICAL_FIELDS + FILTER_DATE_FIELDS if hasattr(model, field)
+    ]
+    range_fields = [field for field in FILTER_RANGE_FIELDS if hasattr(model, field)]
+    grouped_columns = [getattr(model, field) for field in grouped_fields]
+
+    query = (
+        select(
+            func.grouping(*grouped_columns).label("grouping_id"),
+            *grouped_columns,
+            func.count().label("count"),
+            *(func.min(getattr(model, field)).label(f"{field}_min") for field in range_fields),
+            *(func.max(getattr(model, field)).label(f"{field}_max") for field in range_fields),
+        )
+        .group_by(func.grouping_sets(*(tuple_(column) for column in grouped_columns), tuple_()))
+        # Within a field's grouping set the other columns are all NULL, so this orders
+        # each field's values the way ORDER BY on the field alone would
+        .order_by(text("grouping_id"), *grouped_columns)
+    )
+    return query, grouped_fields
+
+
+def collect_filter_options(rows, grouped_fields):
+    """Build the filter_options dict from the rows of filter_options_query"""
+    all_grouped = (1 << len(grouped_fields)) - 1
+    field_by_grouping_id = {
+        all_grouped ^ (1 << (len(grouped_fields) - 1 - position)): field
+        for position, field in enumerate(grouped_fields)
+    }
+
+    results = {field: [] for field in grouped_fields if field in FILTER_CATEGORICAL_FIELDS}
+    date_results = {field: [] for field in grouped_fields if field in FILTER_DATE_FIELDS}
+    for row in rows:
+        grouping_id = row["grouping_id"]
+        if grouping_id == all_grouped:
+            # The grand total row carries the range fields' bounds
+            for field in FILTER_RANGE_FIELDS:
+                if f"{field}_min" not in row._mapping:
+                    continue
+                min_value = row[f"{field}_min"]
+                max_value = row[f"{field}_max"]
+                results[field] = {
+                    "min": min_value if min_value is not None else 0,
+                    "max": max_value if max_value is not None else 0
+                }
+            continue
+
+        field = field_by_grouping_id[grouping_id]
+        value = row[field]
+        if value is None:
+            continue
+        if field in date_results:
+            # Convert dates to string format
+            date_str = value.isoformat() if isinstance(value, date) else str(value)
+            date_results[field].append({"value": date_str, "count": row["count"]})
+        else:
+            results[field].append({"value": value, "count": row["count"]})
+
+    # Keep the response's field order: categorical, range, then date fields
+    results.update(date_results)
+    return results
+
+
+def filter_summary_name(table_name):
+    return f"{table_name}_filter_summary"
+
+
+def create_filter_summary_sql(model):
+    """
+    Materialized view over filter_options_query, and the unique index that REFRESH
+    MATERIALIZED VIEW CONCURRENTLY needs
+    """
+    query, grouped_fields = filter_options_query(model)
+    definition = query.order_by(None).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    name = filter_summary_name(model.__tablename__)
+    key_columns = ", ".join(["grouping_id"] + [f'"{getattr(model, field).expression.name}"' for field in grouped_fields])
+    return [
+        text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {definition}"),
+        text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} ({key_columns})"),
+    ]
+
+
+def refresh_filter_summary_sql(model):
+    # CONCURRENTLY keeps the view readable while it is rebuilt
+    return text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {filter_summary_name(model.__tablename__)}")
+
+
+def filter_summary_query(model):
+    """Read a table's filter summary in the order filter_options_query returns its rows"""
+    query, grouped_fields = filter_options_query(model)
+    summary = table(
+        filter_summary_name(model.__tablename__),
+        *(column(name) for name in query.selected_columns.keys()),
+    )
+    ordered = select(summary).order_by(summary.c.grouping_id, *(summary.c[field] for field in grouped_fields))
+    return ordered, grouped_fields
+
+
+def collect_forecast_stats(rows, grouped_fields):
+    """Build the /forecast/stats response from the rows of a filter summary"""
+    all_grouped = (1 << len(grouped_fields)) - 1
+    positions = {field: position for position, field in enumerate(grouped_fields)}
+
+    def values_of(field):
+        grouping_id = all_grouped ^ (1 << (len(grouped_fields) - 1 - positions[field]))
+        return [row[field] for row in rows if row["grouping_id"] == grouping_id]
+
+    total_records = next((row["count"] for row in rows if row["grouping_id"] == all_grouped), 0)
+    return {
+        "total_records": total_records,
+        # Convert dates to strings
+        "week_start_dates": [
+            value.isoformat() if isinstance(value, date) else str(value)
+            for value in values_of("week_start_date")
+        ],
+        "super_categories": values_of("super_category"),
+        "store_types": values_of("store_type"),
+    }
+
+
+async def fetch_filter_summary(database, model):
+    """
+    Rows of a table's filter summary, computed from the table itself if the view is missing
+    (e.g. it is being created by another worker at startup)
+
+    Returns:
+        (rows, grouped fields)
+    """
+    query, grouped_fields = filter_summary_query(model)
+    try:
+        return await database.fetch_all(query), grouped_fields
+    except Exception as e:
+        print(f"Filter summary of {model.__tablename__} unavailable, scanning the table: {str(e)}")
+        query, grouped_fields = filter_options_query(model)
+        return await database.fetch_all(query), grouped_fields
+
+
+async def refresh_filter_summaries(database, models=None):
+    """
+    Refresh the filter summaries after the data of models (default: all summarized tables)
+    changed. A failed refresh leaves the summary stale, so callers must report the errors.
+
+    Returns:
+        List of error messages, one per summary that could not be refreshed
+    """
+    errors = []
+    for model in models or SUMMARY_MODELS:
+        try:
+            await database.execute(refresh_filter_summary_sql(model))
+        except Exception as e:
+            error_msg = f"Error refreshing filter summary of {model.__tablename__}: {str(e)}"
+            print(error_msg)
+            errors.append(error_msg)
+    return errors
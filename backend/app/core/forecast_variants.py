@@ -0,0 +1,105 @@
+"""
+Model variant forecasts of forecast_new, stored for scoring in SQL.
+
+forecast_new keeps every variant's forecast in one JSON object per row
+({variant name: quantity}). forecast_new_variant_qty holds the same values as one
+numeric row per (forecast_new row, variant), unpacked by Postgres with json_each, so
+variants are compared with sold_qty in one aggregate instead of decoding JSON per row
+in Python.
+"""
+
+from sqlalchemy import select, func, delete, insert, case, cast, literal_column, true, text, Float
+
+from schema import ForecastVariants, ForecastVariantQty
+
+# Columns the variant scores can be grouped by
+VARIANT_GROUP_FIELDS = ["channel", "region", "super_category", "store_type", "week_start_date"]
+
+
+def variant_qty_insert(*where):
+    """
+    Unpack the forecast_qty objects of the forecast_new rows matching where into
+    forecast_new_variant_qty. Non-numeric values become NULL; rows whose forecast_qty is not
+    an object are skipped.
+    """
+    variants = func.json_each(ForecastVariants.forecast_qty).table_valued("key", "value").lateral("variants")
+    quantity = case(
+        (
+            func.json_typeof(variants.c.value) == literal_column("'number'"),
+            cast(variants.c.value.op("#>>")(literal_column("'{}'")), Float),
+        ),
+    )
+    statement = (
+        select(ForecastVariants.id, ForecastVariants.week_start_date, variants.c.key, quantity)
+        .select_from(ForecastVariants)
+        .join(variants, true())
+        .where(func.json_typeof(ForecastVariants.forecast_qty) == literal_column("'object'"), *where)
+    )
+    return insert(ForecastVariantQty).from_select(["forecast_id", "week_start_date", "variant", "forecast_qty"], statement)
+
+
+async def rebuild_variant_qty(database, weeks=None):
+    """
+    Recompute forecast_new_variant_qty from forecast_new's JSON, for the given weeks
+    (default: all), in one transaction. Run it after writing forecast_new.
+
+    Returns:
+        Number of variant rows written
+    """
+    async with database.transaction():
+        count_query = select(func.count()).select_from(ForecastVariantQty)
+        if weeks is None:
+            await database.execute(text(f"TRUNCATE TABLE {ForecastVariantQty.__tablename__}"))
+            await database.execute(variant_qty_insert())
+        else:
+            weeks = list(weeks)
+            await database.execute(delete(ForecastVariantQty).where(ForecastVariantQty.week_start_date.in_(weeks)))
+            await database.execute(variant_qty_insert(ForecastVariants.week_start_date.in_(weeks)))
+            count_query = count_query.where(ForecastVariantQty.week_start_date.in_(weeks))
+        return await database.fetch_val(count_query)
+
+
+def variant_scores_query(group_fields=(), week_start_from=None, week_start_to=None):
+    """
+    Score every variant against sold_qty in one pass, per variant and group
+
+    Only rows where both the variant forecast and sold_qty are present are scored:
+    - mae: mean absolute error
+    - rmse: root mean squared error
+    - bias: mean of forecast minus sold (positive means over-forecast)
+    - wape: sum of absolute errors as a percentage of the sold quantity
+    """
+    error = ForecastVariantQty.forecast_qty - ForecastVariants.sold_qty
+    total_sold = func.sum(ForecastVariants.sold_qty)
+    group_columns = [getattr(ForecastVariants, field) for field in group_fields]
+
+    query = (
+        select(
+            ForecastVariantQty.variant,
+            *(column.label(field) for field, column in zip(group_fields, group_columns)),
+            func.count().label("scored_rows"),
+            func.avg(func.abs(error)).label("mae"),
+            func.sqrt(func.avg(error * error)).label("rmse"),
+            func.avg(error).label("bias"),
+            case(
+                (total_sold == literal_column("0"), None),
+                else_=func.sum(func.abs(error)) * literal_column("100") / total_sold,
+            ).label("wape"),
+            func.sum(ForecastVariantQty.forecast_qty).label("total_qty_predicted"),
+            total_sold.label("total_qty_sold"),
+        )
+        .select_from(ForecastVariantQty)
+        .join(
+            ForecastVariants,
+            (ForecastVariants.id == ForecastVariantQty.forecast_id)
+            & (ForecastVariants.week_start_date == ForecastVariantQty.week_start_date),
+        )
+        .where(ForecastVariantQty.forecast_qty.isnot(None), ForecastVariants.sold_qty.isnot(None))
+        .group_by(*group_columns, ForecastVariantQty.variant)
+        .order_by(*group_columns, ForecastVariantQty.variant)
+    )
+    if week_start_from:
+        query = query.where(ForecastVariantQty.week_start_date >= week_start_from)
+    if week_start_to:
+        query = query.where(ForecastVariantQty.week_start_date <= week_start_to)
+    return query
@@ -0,0 +1,249 @@
+"""
+Background jobs for long running ingest endpoints (/core/load-data, /utils/substitute).
+
+The endpoints submit a job and return its id right away; the work runs as an asyncio task
+on the worker that accepted the request, at most max_concurrent_jobs at a time per worker.
+Job state is kept in the background_job table, so GET /jobs/{job_id} can be answered by
+any uvicorn worker. Workers renew a lease on their queued and running jobs, so the jobs of
+a worker that died are marked as failed by the others.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Any
+from uuid import uuid4
+import asyncio
+import traceback
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+from sqlalchemy import select, update, insert, func, or_
+
+from schema import BackgroundJob
+
+# Progress is written to the database at most this often while a job runs
+JOB_PROGRESS_FLUSH_SECONDS = 1.0
+# Each worker renews the lease of its queued and running jobs this often. A job whose lease
+# is older than JOB_LEASE_SECONDS belonged to a worker that died, and is marked as failed.
+JOB_LEASE_RENEW_SECONDS = 15
+JOB_LEASE_SECONDS = 60
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def lease_expiry():
+    return func.now() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+class JobSubmittedResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class JobStatusResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    rows_processed: int
+    rows_per_second: Optional[float] = None
+    current_file: Optional[str] = None
+    errors: List[str] = []
+    result: Optional[Any] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobProgress:
+    """
+    Progress of a running job, passed to the job function as its first argument. The
+    manager writes it to the database from its own task, so on its own connection: progress
+    is visible while the job is inside a transaction, and survives that transaction's rollback.
+    """
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self.rows_processed = 0
+        self.current_file = None
+        self.errors = []
+        self.changed = False
+
+    async def update(self, rows=0, current_file=None, error=None):
+        """Add processed rows, set the file being worked on, or record an error"""
+        self.rows_processed += rows
+        if current_file is not None:
+            self.current_file = current_file
+        if error is not None:
+            self.errors.append(error)
+        self.changed = True
+
+    async def flush(self, **values):
+        await self.manager.write_progress(self, **values)
+
+
+class JobManager:
+    def __init__(self, database, max_concurrent_jobs=1):
+        self.database = database
+        self._semaphore = asyncio.Semaphore(max_concurrent_jobs)
+        # Keep references so running tasks are not garbage collected
+        self._tasks = set()
+        # Queued or running jobs of this worker, whose leases it renews
+        self._job_ids = set()
+        self._lease_task = None
+        # Progress of running jobs, written by the progress task
+        self._progress = {}
+        self._progress_task = None
+        # Keeps a progress write from landing after the job's final one
+        self._write_lock = asyncio.Lock()
+
+    def start(self):
+        """
+        Start writing job progress, renewing this worker's job leases and failing jobs of
+        workers that died
+        """
+        self._lease_task = asyncio.create_task(self._lease_loop())
+        self._progress_task = asyncio.create_task(self._progress_loop())
+
+    async def _progress_loop(self):
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_FLUSH_SECONDS)
+            for progress in list(self._progress.values()):
+                if not progress.changed:
+                    continue
+                try:
+                    await self.write_progress(progress)
+                except Exception as e:
+                    print(f"Error writing progress of job {progress.job_id}: {str(e)}")
+
+    async def write_progress(self, progress, **values):
+        async with self._write_lock:
+            progress.changed = False
+            await self.update_job(
+                progress.job_id,
+                rows_processed=progress.rows_processed,
+                current_file=progress.current_file,
+                errors=list(progress.errors),
+                **values,
+            )
+
+    async def _lease_loop(self):
+        while True:
+            try:
+                if self._job_ids:
+                    await self.database.execute(
+                        update(BackgroundJob)
+                        .where(BackgroundJob.id.in_(list(self._job_ids)))
+                        .values(lease_expires_at=lease_expiry())
+                    )
+                await self.fail_expired_jobs()
+            except Exception as e:
+                print(f"Error renewing job leases: {str(e)}")
+            await asyncio.sleep(JOB_LEASE_RENEW_SECONDS)
+
+    async def fail_expired_jobs(self):
+        """
+        Mark queued or running jobs whose lease ran out as failed: the worker running them
+        died or restarted. Leases are compared on the database clock.
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        expired = (
+            update(BackgroundJob)
+            .where(
+                BackgroundJob.status.in_(["queued", "running"]),
+                or_(BackgroundJob.lease_expires_at.is_(None), BackgroundJob.lease_expires_at < func.now()),
+            )
+            .values(status="failed", errors=["interrupted by restart"], finished_at=func.now())
+            .returning(BackgroundJob.id)
+        )
+        rows = await self.database.fetch_all(expired)
+        if rows:
+            print(f"Marked {len(rows)} interrupted jobs as failed")
+        return len(rows)
+
+    async def submit(self, kind, job_function, *args, **kwargs):
+        """
+        Queue job_function(progress, *args, **kwargs) to run in the background
+
+        Returns:
+            The new job id
+        """
+        job_id = uuid4().hex
+        await self.database.execute(
+            insert(BackgroundJob).values(
+                id=job_id, kind=kind, status="queued", rows_processed=0, errors=[], lease_expires_at=lease_expiry()
+            )
+        )
+        self._job_ids.add(job_id)
+
+        task = asyncio.create_task(self._run(job_id, job_function, args, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run(self, job_id, job_function, args, kwargs):
+        async with self._semaphore:
+            progress = JobProgress(self, job_id)
+            await self.update_job(job_id, status="running", started_at=datetime.now(timezone.utc))
+            self._progress[job_id] = progress
+            try:
+                result = await job_function(progress, *args, **kwargs)
+                del self._progress[job_id]
+                await progress.flush(status="succeeded", result=result, finished_at=datetime.now(timezone.utc))
+            except Exception as e:
+                self._progress.pop(job_id, None)
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                print(f"Job {job_id} failed: {detail}")
+                print(traceback.format_exc())
+                progress.errors.append(str(detail))
+                await progress.flush(status="failed", finished_at=datetime.now(timezone.utc))
+            finally:
+                self._job_ids.discard(job_id)
+
+    async def update_job(self, job_id, **values):
+        await self.database.execute(
+            update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values)
+        )
+
+    async def get_job(self, job_id):
+        row = await self.database.fetch_one(select(BackgroundJob).where(BackgroundJob.id == job_id))
+        return dict(row) if row else None
+
+
+def job_submitted_response(job_id):
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+
+def get_job_manager(request: Request) -> JobManager:
+    return request.app.state.job_manager
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str,
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    """
+    Get the status of a background job
+
+    Returns rows processed, throughput (rows per second since the job started), the file
+    currently being processed, errors so far, and the job's result once it has succeeded
+    """
+    job = await job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    rows_per_second = None
+    if job["started_at"]:
+        end = job["finished_at"] or datetime.now(timezone.utc)
+        elapsed = (end - job["started_at"]).total_seconds()
+        if elapsed > 0:
+            rows_per_second = round(job["rows_processed"] / elapsed, 1)
+
+    return {
+        **job,
+        "rows_per_second": rows_per_second,
+        "errors": job["errors"] or [],
+    }
@@ -1,19 +1,82 @@
 from fastapi import APIRouter, Depends, Query, Request, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Any, Dict, Literal, Union
 from pydantic import BaseModel, Field
-from sqlalchemy import select, func, text, Column, Integer, String, Float, DateTime, JSON, Date, or_, and_, asc, desc, case
+from sqlalchemy import select, func, text, Column, Integer, String, Float, DateTime, JSON, Date
 import os
+import asyncio
+import io
 import csv
-import pandas as pd
 from datetime import datetime, date
-import glob
-from pathlib import Path
-from sqlalchemy.inspection import inspect
 import json
+import time
 import traceback
 
-from schema import Forecast
-from db.postgres_db import PostgresDatabase
+from schema import Forecast, ForecastRollup, ForecastVariantQty
+from utils.commons import (
+    FastJSONResponse,
+    ColumnarResponse,
+    json_dumps,
+    rows_to_dicts,
+    rows_to_arrow,
+    negotiate_columnar_format,
+    run_concurrently,
+)
+from db.postgres_db import PostgresDatabase, FORECAST_TABLES
+from core.forecast_query import (
+    parse_forecast_spec,
+    compile_forecast_plan,
+    fetch_plan,
+    iterate_plan,
+    encode_cursor,
+    decode_cursor,
+    arrow_schema,
+    parse_json_param,
+    compile_facet_plan,
+    collect_facets,
+    compile_metrics_plan,
+    compile_timeseries_plan,
+    FORECAST_FIELDS,
+    METRIC_GROUP_FIELDS,
+)
+from core.forecast_dataset import (
+    FORECAST_DATA_DIRS,
+    forecast_partition_filter,
+    scan_partitions,
+    convert_forecast_csv_to_parquet,
+)
+from core.forecast_loader import (
+    partition_key,
+    fetch_manifest,
+    is_partition_unchanged,
+    prepare_forecast_partitions,
+    replace_forecast_partition,
+    touch_manifest_partition,
+    stage_forecast_partition,
+    attach_forecast_week,
+    drop_forecast_week,
+    clear_manifest,
+    fetch_load_generation,
+    ForecastFileError,
+)
+from db.partitions import (
+    is_partitioned,
+    list_week_partitions,
+    create_staging_table,
+    drop_week_partitions,
+    week_partition_name,
+)
+from core.forecast_summary import (
+    collect_filter_options,
+    collect_forecast_stats,
+    fetch_filter_summary,
+    refresh_filter_summaries,
+    filter_summary_name,
+    FILTER_CATEGORICAL_FIELDS,
+)
+from core.forecast_rollup import delete_rollup_weeks, rebuild_rollup
+from core.forecast_variants import VARIANT_GROUP_FIELDS, rebuild_variant_qty, variant_scores_query
+from core.jobs import JobSubmittedResponse, get_job_manager, job_submitted_response
 
 router = APIRouter(prefix="/core", tags=["core"])
 
@@ -70,23 +133,97 @@ class ForecastResponse(BaseModel):
 class PaginatedForecastResponse(BaseModel):
     total: int
     items: List[ForecastResponse]
+    next_cursor: Optional[str] = None
+    total_is_exact: bool = True
 
 def row_to_dict(row):
     """Convert a database row to a dictionary with proper date serialization"""
-    result = {}
-    # Use dictionary-like access instead of .items() method
-    for key in row.keys():
-        value = row[key]
-        # Convert date and datetime objects to strings
-        if isinstance(value, (date, datetime)):
-            result[key] = value.isoformat()
-        else:
-            result[key] = value
-    return result
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in dict(row).items()
+    }
 
 async def get_postgres_db(request: Request):
     return request.app.state.postgres_db.database
 
+# Exact counts cached per normalized filter set, with the load generation they were counted
+# at, so a load or delete by any worker invalidates them
+COUNT_CACHE_MAX_ENTRIES = 1024
+_count_cache: Dict[str, tuple] = {}
+
+def clear_count_cache():
+    _count_cache.clear()
+
+async def fetch_total_count(postgres_db, spec, count_mode):
+    """
+    Get the total row count for a forecast listing
+
+    Returns:
+        Tuple of (total, is_exact)
+    """
+    if count_mode == "estimated":
+        # The planner's estimate is derived from pg_class.reltuples and column statistics
+        plan = await fetch_plan(postgres_db, compile_forecast_plan(spec.shape, "explain"), spec.params, "fetchval")
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), False
+
+    if count_mode == "cached":
+        generation = await fetch_load_generation(postgres_db)
+        cached = _count_cache.get(spec.count_key)
+        if cached and cached[1] == generation:
+            return cached[0], True
+
+    total = await fetch_plan(postgres_db, compile_forecast_plan(spec.shape, "count"), spec.params, "fetchval")
+
+    if count_mode == "cached":
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[spec.count_key] = (total, generation)
+
+    return total, True
+
+STREAM_CHUNK_ROWS = 1000
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def stream_rows(postgres_db, spec, response_format):
+    """
+    Stream query results as NDJSON or CSV chunks.
+
+    Rows are read through a server-side cursor and flushed every STREAM_CHUNK_ROWS
+    rows, so memory stays flat regardless of the result size.
+    """
+    plan = compile_forecast_plan(spec.shape, "all")
+
+    if response_format == "ndjson":
+        lines = []
+        async for row in iterate_plan(postgres_db, plan, spec.params, STREAM_CHUNK_ROWS):
+            lines.append(json_dumps(dict(row)))
+            if len(lines) >= STREAM_CHUNK_ROWS:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(plan[2])
+
+    rows_in_chunk = 0
+    async for row in iterate_plan(postgres_db, plan, spec.params, STREAM_CHUNK_ROWS):
+        writer.writerow(row_to_dict(row).values())
+
+        rows_in_chunk += 1
+        if rows_in_chunk >= STREAM_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows_in_chunk = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
 class FilterRangeModel(BaseModel):
     type: Literal["range"]
     min: Optional[float] = None
@@ -111,312 +248,352 @@ async def get_forecast(
     super_category: Optional[str] = None,
     store_type: Optional[str] = None,
     all_records: bool = Query(False, description="If true, returns all records (ignores limit/offset)"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. 'article_id,store_no,forecast_qty' (default: all)"),
     search: Optional[str] = Query(None, description="JSON string for search criteria, format: {'field':'value'}"),
+    search_mode: Literal["contains", "prefix"] = Query("contains", description="Match search values anywhere in the field or only at its start"),
     filters: Optional[str] = Query(None, description="JSON string for filter criteria"),
     sort: Optional[str] = Query(None, description="JSON string for sort criteria, format: {'field':'field_name','direction':'asc|desc'}"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor (ignores offset)"),
+    count: Literal["exact", "estimated", "cached"] = Query("exact", description="How to compute total: exact count, planner estimate, or exact count cached until the next data load"),
+    response_format: Literal["json", "ndjson", "csv", "arrow", "parquet"] = Query("json", alias="format", description="ndjson/csv stream every matching row (ignores limit/offset/cursor); arrow/parquet return the page as a columnar body"),
     postgres_db=Depends(get_postgres_db),
 ):
     """
     Get paginated forecast data with optional filters, search, and sorting
     
     Query Parameters:
+    - fields: comma-separated model columns to select and return; id (and the sort column) are always included
     - search: JSON string specifying search criteria (e.g. {"article_id":"12345"})
+    - search_mode: "contains" (substring) or "prefix". Both are served by trigram indexes on
+      the searchable columns; prefix is the fast path for short terms
     - filters: JSON string specifying filter criteria (e.g. {"forecast_qty":{"type":"range","min":10,"max":100},"region":{"type":"discrete","values":["North","South"]}})
     - sort: JSON string specifying sort criteria (e.g. {"field":"forecast_qty","direction":"desc"})
+    - cursor: next_cursor returned by the previous page. Pages after the cursor using the
+      last row's sort key and id instead of OFFSET, so deep pages cost the same as the first.
+      Must be sent with the same search, filters and sort as the page that returned it.
+    - count: "exact" runs COUNT(*), "estimated" uses the planner's row estimate (total_is_exact
+      is false), "cached" reuses the exact count for the same filters until the next data load
+    - format: "ndjson" or "csv" streams all matching rows as an export instead of returning a JSON page.
+      "arrow" (Arrow IPC stream) or "parquet" returns the page as a columnar body, with total,
+      total_is_exact and next_cursor in the X-Total-Count, X-Total-Is-Exact and X-Next-Cursor headers.
+      Columnar bodies can also be requested with an Accept header of
+      application/vnd.apache.arrow.stream or application/vnd.apache.parquet
     """
-    # Build base query
-    query = select(Forecast)
-    count_query = select(func.count()).select_from(Forecast.__table__)
+    spec = parse_forecast_spec(
+        week_start_date=week_start_date,
+        super_category=super_category,
+        store_type=store_type,
+        fields=fields,
+        search=search,
+        search_mode=search_mode,
+        filters=filters,
+        sort=sort,
+    )
     
-    # Apply filters if provided
-    if week_start_date:
-        try:
-            date_obj = datetime.strptime(week_start_date, '%Y-%m-%d').date()
-            query = query.where(Forecast.week_start_date == date_obj)
-            count_query = count_query.where(Forecast.week_start_date == date_obj)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    
-    if super_category:
-        query = query.where(Forecast.super_category == super_category)
-        count_query = count_query.where(Forecast.super_category == super_category)
-    
-    if store_type:
-        query = query.where(Forecast.store_type == store_type)
-        count_query = count_query.where(Forecast.store_type == store_type)
-    
-    # Apply search criteria if provided
-    if search:
-        try:
-            search_criteria = json.loads(search)
-            search_conditions = []
-            
-            for field, value in search_criteria.items():
-                if hasattr(Forecast, field):
-                    column = getattr(Forecast, field)
-                    # Use LIKE for string fields
-                    if isinstance(value, str):
-                        search_conditions.append(column.ilike(f"%{value}%"))
-                    else:
-                        search_conditions.append(column == value)
-            
-            if search_conditions:
-                query = query.where(or_(*search_conditions))
-                count_query = count_query.where(or_(*search_conditions))
-                
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON in search parameter")
-    
-    # Apply filter criteria if provided
-    if filters:
-        try:
-            filter_criteria = json.loads(filters)
-            filter_conditions = []
-            
-            for field, filter_spec in filter_criteria.items():
-                if hasattr(Forecast, field):
-                    column = getattr(Forecast, field)
-                    
-                    if filter_spec.get("type") == "range":
-                        min_val = filter_spec.get("min")
-                        max_val = filter_spec.get("max")
-                        
-                        if min_val is not None:
-                            filter_conditions.append(column >= min_val)
-                        if max_val is not None:
-                            filter_conditions.append(column <= max_val)
-                    
-                    elif filter_spec.get("type") == "discrete":
-                        values = filter_spec.get("values", [])
-                        if values:
-                            # Special handling for date fields
-                            if field == 'week_start_date' and values:
-                                date_values = []
-                                for date_str in values:
-                                    try:
-                                        # Convert string dates to Python date objects
-                                        date_values.append(datetime.strptime(date_str, '%Y-%m-%d').date())
-                                    except (ValueError, TypeError):
-                                        # Skip invalid dates
-                                        pass
-                                if date_values:
-                                    filter_conditions.append(column.in_(date_values))
-                            else:
-                                filter_conditions.append(column.in_(values))
-            
-            if filter_conditions:
-                query = query.where(and_(*filter_conditions))
-                count_query = count_query.where(and_(*filter_conditions))
-                
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON in filters parameter")
-    
-    # Apply sorting if provided
-    if sort:
-        try:
-            sort_criteria = json.loads(sort)
-            sort_field = sort_criteria.get("field")
-            sort_direction = sort_criteria.get("direction", "asc")
-            
-            if sort_field and hasattr(Forecast, sort_field):
-                column = getattr(Forecast, sort_field)
-                if sort_direction == "desc":
-                    query = query.order_by(desc(column))
-                else:
-                    query = query.order_by(asc(column))
-                
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON in sort parameter")
+    # Exports are streamed straight from a server-side cursor, without a total count
+    if response_format in STREAM_MEDIA_TYPES:
+        return StreamingResponse(
+            stream_rows(postgres_db, spec, response_format),
+            media_type=STREAM_MEDIA_TYPES[response_format],
+            headers={"Content-Disposition": f"attachment; filename=forecast.{response_format}"}
+        )
     
     # Add pagination unless all_records is specified
-    if not all_records:
-        query = query.offset(offset).limit(limit)
-    
-    # Execute queries
-    results = await postgres_db.fetch_all(query)
-    total_count = await postgres_db.fetch_val(count_query)
+    params = dict(spec.params)
+    if all_records:
+        plan = compile_forecast_plan(spec.shape, "all")
+    else:
+        if cursor:
+            last_value, last_id = decode_cursor(cursor, spec)
+            plan = compile_forecast_plan(spec.shape, "cursor_null" if last_value is None else "cursor")
+            params["cursor_value"] = last_value
+            params["cursor_id"] = last_id
+        else:
+            plan = compile_forecast_plan(spec.shape, "page")
+            params["offset"] = offset
+        # Fetch one extra row to know whether there is a next page
+        params["limit"] = limit + 1
+    
+    # Run the page and count queries in parallel on separate pooled connections
+    results, (total_count, total_is_exact) = await run_concurrently(
+        fetch_plan(postgres_db, plan, params),
+        fetch_total_count(postgres_db, spec, count),
+    )
     
-    # Convert database rows to dictionaries with proper date handling
-    items = [row_to_dict(row) for row in results]
+    next_cursor = None
+    if not all_records and len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(results[-1], spec)
+    
+    columnar_format = negotiate_columnar_format(request, response_format)
+    if columnar_format:
+        headers = {"X-Total-Count": str(total_count), "X-Total-Is-Exact": str(total_is_exact).lower()}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return ColumnarResponse(
+            rows_to_arrow(results, plan[2], arrow_schema(plan[2])),
+            columnar_format,
+            filename="forecast",
+            headers=headers
+        )
     
-    return {
+    # Rows come straight from the forecast table, so skip re-validating them
+    # against ForecastResponse and encode dates and floats with orjson
+    return FastJSONResponse({
         "total": total_count,
-        "items": items
-    }
+        "items": rows_to_dicts(results),
+        "next_cursor": next_cursor,
+        "total_is_exact": total_is_exact
+    })
 
 class DataLoadResponse(BaseModel):
     total_files_processed: int
     total_records_loaded: int
     files_processed: List[str]
+    partitions_loaded: int = 0
+    partitions_unchanged: int = 0
     errors: List[str] = []
+    # Wall time per load stage: clear, scan, parse_wait (writer waiting on the parse
+    # workers), copy, attach, refresh_summary and total
+    stage_seconds: Dict[str, float] = {}
 
-def filter_valid_columns(records, model_class):
+async def run_forecast_load(
+    progress,
+    postgres_db,
+    clear_existing=False,
+    debug=False,
+    load_workers=None,
+    source_format="csv",
+    partition_filter=None,
+    data_dir=None,
+):
     """
-    Filter records to include only columns that exist in the model
+    Load forecast data from CSV or Parquet files in the data directory. Runs as a background job.
+    
+    Loads are incremental: partitions recorded in the load manifest whose part files and
+    _SUCCESS marker are unchanged are skipped, and new or changed partitions replace their
+    existing rows. Only partitions matching partition_filter (see forecast_partition_filter)
+    are listed and loaded. data_dir overrides the source format's default directory.
     
-    Args:
-        records: List of dictionaries with data
-        model_class: SQLAlchemy model class
-        
     Returns:
-        List of filtered dictionaries
+        DataLoadResponse as a dict
     """
-    # Get valid column names from the model
-    valid_columns = [column.key for column in inspect(model_class).columns]
+    stage_seconds = {}
+    load_started = stage_started = time.perf_counter()
     
-    # Filter records to include only valid columns
-    filtered_records = []
-    for record in records:
-        filtered_record = {k: v for k, v in record.items() if k in valid_columns}
-        filtered_records.append(filtered_record)
+    def end_stage(stage):
+        nonlocal stage_started
+        now = time.perf_counter()
+        stage_seconds[stage] = round(stage_seconds.get(stage, 0.0) + now - stage_started, 3)
+        stage_started = now
     
-    return filtered_records
-
-@router.post("/load-data", response_model=DataLoadResponse)
-async def load_forecast_data(
-    request: Request,
-    clear_existing: bool = Query(False, description="Clear existing data before loading"),
-    debug: bool = Query(False, description="Display more detailed debug information"),
-    postgres_db=Depends(get_postgres_db),
-):
-    """
-    Load forecast data from CSV files in the data directory
+    partitioned = await is_partitioned(postgres_db, Forecast.__tablename__)
     
-    Parameters:
-    - clear_existing: If True, clear all existing forecast data before loading
-    - debug: If True, display more detailed debug information
-    """
     # Clear existing data if requested
     if clear_existing:
+        if partitioned:
+            # Every week is then loaded into a fresh table and attached
+            await drop_week_partitions(postgres_db, Forecast.__tablename__)
         truncate_query = f"TRUNCATE TABLE {Forecast.__tablename__}"
-        await postgres_db.execute(truncate_query)
+        async with postgres_db.transaction():
+            await postgres_db.execute(truncate_query)
+            await clear_manifest(postgres_db)
+            await delete_rollup_weeks(postgres_db)
         print("Cleared existing forecast data")
+    end_stage("clear")
     
-    # Path to data directory relative to the application root
-    data_dir = Path("data")
-    
-    if not data_dir.exists():
-        raise HTTPException(status_code=404, detail="Data directory not found")
+    # Weeks without a partition are loaded into a standalone staging table that is attached
+    # once all of the week's files are in, instead of inserting into the partitioned table
+    week_partitions = await list_week_partitions(postgres_db, Forecast.__tablename__) if partitioned else None
+    staged_weeks = {}
     
     total_records = 0
     files_processed = []
-    errors = []
     
-    # Find all CSV files in the data directory structure
-    csv_files = glob.glob(str(data_dir) + "/**/part-*.csv", recursive=True)
-    
-    for csv_file in csv_files:
-        # Extract metadata from the file path
-        path_parts = Path(csv_file).parts
-        
-        # Parse the folder structure to extract metadata
-        week_start_date = None
-        super_category = None
-        store_type = None
-        
-        for part in path_parts:
-            if part.startswith("week_start_date="):
-                week_start_date = part.split("=")[1]
-            elif part.startswith("family="):
-                super_category = part.split("=")[1]
-            elif part.startswith("channel_online_offline="):
-                store_type = part.split("=")[1]
-        
-        if week_start_date and super_category and store_type:
-            try:
-                # Read the CSV file
-                df = pd.read_csv(csv_file)
-                
-                if debug:
-                    print(f"File {csv_file} loaded, columns: {df.columns.tolist()}")
-                    print(f"Sample data types: {df.dtypes}")
-                
-                # Add the metadata columns
-                df['week_start_date'] = pd.to_datetime(week_start_date).date()
-                df['super_category'] = super_category
-                df['store_type'] = store_type
-                
-                # Handle column mapping and type conversions
-                # Ensure numeric columns are properly converted
-                numeric_columns = ['consensus_qty', 'forecast_qty', 'sold_qty', 'wom']
-                for col in numeric_columns:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-                
-                # Convert class column to class_description (since 'class' is a reserved keyword)
-                if 'class' in df.columns:
-                    df['class_description'] = df['class']
-                    df = df.drop('class', axis=1)
-                
-                # Make sure all values are strings, especially article_id
-                string_columns = ['p1_dc', 'format', 'city', 'state', 'segment_code', 'brick_description', 
-                                'brand', 'segment', 'division', 'brick_code', 'class_code', 'division_code',
-                                'vertical', 'store_no', 'batchno', 'status', 'article_id', 'month_year',
-                                'pin_code', 'region', 'family_code', 'sd', 'article_description', 'kvi', 'npi']
-                for col in string_columns:
-                    if col in df.columns:
-                        df[col] = df[col].astype(str)
-                        
-                # Convert DataFrame to list of dictionaries
-                records = df.to_dict(orient='records')
-                
-                # Skip empty files
-                if not records:
-                    continue
-                
-                # Filter records to include only valid columns
-                valid_records = filter_valid_columns(records, Forecast)
-                
-                if debug:
-                    # Display first record for debugging
-                    print(f"Sample record after processing: {json.dumps(valid_records[0])}")
-                
-                # Insert batch size for large files
-                batch_size = 1000
-                for i in range(0, len(valid_records), batch_size):
-                    batch = valid_records[i:i+batch_size]
-                    try:
-                        # Insert records into database using raw SQL
-                        insert_stmt = Forecast.__table__.insert()
-                        insert_sql = str(insert_stmt.compile(compile_kwargs={"literal_binds": False}))
-                        
-                        # Convert the SQLAlchemy parameterized query to a format databases library can use
-                        # We'll just execute one by one for compatibility
-                        for record in batch:
-                            await postgres_db.execute(insert_stmt, record)
-                            
-                    except Exception as batch_error:
-                        if debug:
-                            # If in debug mode, try to identify problematic records
-                            for idx, record in enumerate(batch):
-                                try:
-                                    await postgres_db.execute(insert_stmt, record)
-                                except Exception as record_error:
-                                    print(f"Error with record {i+idx}: {str(record_error)}")
-                                    print(f"Record: {json.dumps(record)}")
-                        raise batch_error
-                
-                total_records += len(valid_records)
-                files_processed.append(csv_file)
-                
-            except Exception as e:
-                error_msg = f"Error processing file {csv_file}: {str(e)}"
-                print(error_msg)
-                if debug:
-                    print(traceback.format_exc())
-                errors.append(error_msg)
+    # Files outside a complete week_start_date/family/channel_online_offline partition are skipped
+    partitions, errors = scan_partitions(source_format, data_dir, partition_filter)
+    for error_msg in errors:
+        await progress.update(error=error_msg)
+    
+    manifest = await fetch_manifest(postgres_db)
+    partitions_unchanged = 0
+    pending_partitions = []
+    for partition in partitions:
+        manifest_entry = manifest.get(partition_key(partition))
+        if is_partition_unchanged(partition, manifest_entry):
+            partitions_unchanged += 1
+            continue
+        # Files whose stats changed are checksummed first, and only parsed if their contents changed
+        known_checksum = manifest_entry["checksum"] if manifest_entry else None
+        pending_partitions.append((partition, known_checksum))
+    end_stage("scan")
+    
+    async def count_rows(rows):
+        await progress.update(rows=rows)
+    
+    # Partitions are parsed in worker processes and copied into the table chunk by chunk
+    partitions_loaded = 0
+    prepared_partitions = []
+    async for prepared_partition in prepare_forecast_partitions(
+        pending_partitions, workers=load_workers, debug=debug
+    ):
+        prepared_partitions.append(prepared_partition)
+        partition = prepared_partition.partition
+        try:
+            if prepared_partition.unchanged:
+                await touch_manifest_partition(postgres_db, partition, manifest[partition_key(partition)])
+                partitions_unchanged += 1
                 continue
-    
-    if errors and not files_processed:
+            
+            await progress.update(current_file=partition["path"])
+            week_start_date = partition["week_start_date"]
+            if partitioned and week_start_date not in week_partitions:
+                if week_start_date not in staged_weeks:
+                    await create_staging_table(postgres_db, Forecast.__tablename__, week_start_date)
+                    staged_weeks[week_start_date] = []
+                staging_table = week_partition_name(Forecast.__tablename__, week_start_date)
+                copied_records = await stage_forecast_partition(
+                    postgres_db, staging_table, prepared_partition, on_chunk=count_rows
+                )
+                staged_weeks[week_start_date].append((partition, prepared_partition.checksum, copied_records))
+                continue
+            
+            # Replace the partition's rows in one COPY transaction instead of one INSERT round trip per row
+            copied_records = await replace_forecast_partition(postgres_db, prepared_partition, on_chunk=count_rows)
+            total_records += copied_records
+            files_processed.extend(file_info["path"] for file_info in partition["files"])
+            partitions_loaded += 1
+            
+        except Exception as e:
+            error_msg = str(e) if isinstance(e, ForecastFileError) else f"Error processing partition {partition['path']}: {str(e)}"
+            print(error_msg)
+            if debug:
+                print(traceback.format_exc())
+            errors.append(error_msg)
+            await progress.update(error=error_msg)
+            continue
+    
+    end_stage("copy")
+    stage_seconds["parse_wait"] = round(sum(prepared.wait_seconds for prepared in prepared_partitions), 3)
+    stage_seconds["copy"] = round(max(stage_seconds["copy"] - stage_seconds["parse_wait"], 0.0), 3)
+    
+    for week_start_date, staged_partitions in staged_weeks.items():
+        if not staged_partitions:
+            # Every partition of the new week failed; don't leave its empty staging table behind
+            await drop_week_partitions(postgres_db, Forecast.__tablename__, [week_start_date])
+            continue
+        try:
+            await progress.update(current_file=week_partition_name(Forecast.__tablename__, week_start_date))
+            await attach_forecast_week(postgres_db, week_start_date, staged_partitions)
+            for partition, _, copied_records in staged_partitions:
+                total_records += copied_records
+                files_processed.extend(file_info["path"] for file_info in partition["files"])
+                partitions_loaded += 1
+        except Exception as e:
+            error_msg = f"Error attaching partition for week {week_start_date}: {str(e)}"
+            print(error_msg)
+            if debug:
+                print(traceback.format_exc())
+            errors.append(error_msg)
+            await progress.update(error=error_msg)
+    
+    end_stage("attach")
+    clear_count_cache()
+    # The summary only changes if rows were replaced or cleared
+    if files_processed or clear_existing:
+        await progress.update(current_file=filter_summary_name(Forecast.__tablename__))
+        for error_msg in await refresh_filter_summaries(postgres_db, [Forecast]):
+            errors.append(error_msg)
+            await progress.update(error=error_msg)
+    end_stage("refresh_summary")
+    stage_seconds["total"] = round(time.perf_counter() - load_started, 3)
+    
+    if errors and not files_processed and not partitions_unchanged:
         raise HTTPException(status_code=500, detail={"errors": errors})
     
     return {
         "total_files_processed": len(files_processed),
         "total_records_loaded": total_records,
         "files_processed": files_processed,
-        "errors": errors
+        "partitions_loaded": partitions_loaded,
+        "partitions_unchanged": partitions_unchanged,
+        "errors": errors,
+        "stage_seconds": stage_seconds,
     }
 
+@router.post("/load-data", response_model=JobSubmittedResponse, status_code=202)
+async def load_forecast_data(
+    request: Request,
+    clear_existing: bool = Query(False, description="Clear existing data before loading"),
+    debug: bool = Query(False, description="Display more detailed debug information"),
+    source_format: Literal["csv", "parquet"] = Query("csv", description="Load the CSV drop (data/) or its Parquet copy (data_parquet/)"),
+    week_start_from: Optional[date] = Query(None, description="Only load partitions with week_start_date >= this date"),
+    week_start_to: Optional[date] = Query(None, description="Only load partitions with week_start_date <= this date"),
+    super_category: Optional[List[str]] = Query(None, description="Only load these families (repeat the parameter for several)"),
+    store_type: Optional[List[str]] = Query(None, description="Only load these channels, e.g. online"),
+    postgres_db=Depends(get_postgres_db),
+    job_manager=Depends(get_job_manager),
+):
+    """
+    Load forecast data from CSV or Parquet files in the data directory
+    
+    The load runs as a background job and this returns its id immediately. Poll
+    GET /jobs/{job_id} for progress; its result is a DataLoadResponse.
+    
+    Parameters:
+    - clear_existing: If True, clear all existing forecast data (and the load manifest) before loading
+    - debug: If True, display more detailed debug information
+    - source_format: csv or parquet (see POST /core/data/convert-parquet)
+    - week_start_from, week_start_to, super_category, store_type: load only the matching
+      partitions; the other partitions' directories are not read
+    """
+    if not FORECAST_DATA_DIRS[source_format].exists():
+        raise HTTPException(status_code=404, detail="Data directory not found")
+    
+    job_id = await job_manager.submit(
+        "load-data",
+        run_forecast_load,
+        postgres_db,
+        clear_existing=clear_existing,
+        debug=debug,
+        load_workers=request.app.state.settings.load_workers,
+        source_format=source_format,
+        partition_filter=forecast_partition_filter(week_start_from, week_start_to, super_category, store_type),
+    )
+    return job_submitted_response(job_id)
+
+async def run_parquet_conversion(progress, partition_filter=None):
+    """Convert the CSV drop to Parquet. Runs as a background job."""
+    await progress.update(current_file=str(FORECAST_DATA_DIRS["csv"]))
+    result = await asyncio.to_thread(convert_forecast_csv_to_parquet, partition_filter=partition_filter)
+    await progress.update(rows=result["rows_written"])
+    return result
+
+@router.post("/data/convert-parquet", response_model=JobSubmittedResponse, status_code=202)
+async def convert_forecast_data_to_parquet(
+    week_start_from: Optional[date] = Query(None, description="Only convert partitions with week_start_date >= this date"),
+    week_start_to: Optional[date] = Query(None, description="Only convert partitions with week_start_date <= this date"),
+    super_category: Optional[List[str]] = Query(None, description="Only convert these families"),
+    store_type: Optional[List[str]] = Query(None, description="Only convert these channels"),
+    job_manager=Depends(get_job_manager),
+):
+    """
+    Rewrite the CSV data directory as Snappy Parquet under data_parquet/, with the same
+    week_start_date=/family=/channel_online_offline= layout
+    
+    Load the result with POST /core/load-data?source_format=parquet. Converted partitions
+    replace their earlier Parquet files. Runs as a background job.
+    """
+    if not FORECAST_DATA_DIRS["csv"].exists():
+        raise HTTPException(status_code=404, detail="Data directory not found")
+    
+    job_id = await job_manager.submit(
+        "convert-parquet",
+        run_parquet_conversion,
+        partition_filter=forecast_partition_filter(week_start_from, week_start_to, super_category, store_type),
+    )
+    return job_submitted_response(job_id)
+
 class ForecastStatsResponse(BaseModel):
     total_records: int
     week_start_dates: List[str]
@@ -430,37 +607,11 @@ async def get_forecast_stats(
 ):
     """
     Get statistics about the loaded forecast data
-    """
-    # Create queries using SQLAlchemy
-    count_query = select(func.count()).select_from(Forecast.__table__)
-    week_query = select(Forecast.week_start_date).distinct()
-    category_query = select(Forecast.super_category).distinct()
-    type_query = select(Forecast.store_type).distinct()
-    
-    # Execute queries
-    total_records = await postgres_db.fetch_val(count_query)
-    week_results = await postgres_db.fetch_all(week_query)
-    category_results = await postgres_db.fetch_all(category_query)
-    type_results = await postgres_db.fetch_all(type_query)
-    
-    # Format results - properly convert dates to strings
-    week_start_dates = []
-    for row in week_results:
-        date_value = row["week_start_date"]
-        if isinstance(date_value, date):
-            week_start_dates.append(date_value.isoformat())
-        else:
-            week_start_dates.append(str(date_value))
     
-    super_categories = [row["super_category"] for row in category_results]
-    store_types = [row["store_type"] for row in type_results]
-    
-    return {
-        "total_records": total_records,
-        "week_start_dates": week_start_dates, 
-        "super_categories": super_categories,
-        "store_types": store_types
-    }
+    Answered from the forecast_filter_summary materialized view
+    """
+    rows, grouped_fields = await fetch_filter_summary(postgres_db, Forecast)
+    return collect_forecast_stats(rows, grouped_fields)
 
 @router.delete("/forecast/all")
 async def delete_all_forecast_data(
@@ -471,10 +622,48 @@ async def delete_all_forecast_data(
     Delete all forecast data
     """
     truncate_query = f"TRUNCATE TABLE {Forecast.__tablename__}"
-    await postgres_db.execute(truncate_query)
+    async with postgres_db.transaction():
+        await postgres_db.execute(truncate_query)
+        # Forget loaded partitions so the next load ingests everything again
+        await clear_manifest(postgres_db)
+        await delete_rollup_weeks(postgres_db)
+    clear_count_cache()
+    summary_errors = await refresh_filter_summaries(postgres_db, [Forecast])
+    if summary_errors:
+        # The data is gone; retrying the delete refreshes the summary again
+        raise HTTPException(status_code=500, detail={"message": "Forecast data deleted, filter summary not refreshed", "errors": summary_errors})
     
     return {"message": "All forecast data deleted successfully"}
 
+@router.delete("/forecast/week/{week_start_date}")
+async def delete_forecast_week(
+    request: Request,
+    week_start_date: str,
+    postgres_db=Depends(get_postgres_db),
+):
+    """
+    Delete one week of forecast data
+    
+    On the partitioned forecast table this drops the week's partition rather than deleting
+    its rows. The week's load manifest entries are removed, so the next load ingests it again.
+    
+    Parameters:
+    - week_start_date: Week to delete (YYYY-MM-DD)
+    """
+    try:
+        date_obj = datetime.strptime(week_start_date, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+    
+    await drop_forecast_week(postgres_db, date_obj)
+    clear_count_cache()
+    summary_errors = await refresh_filter_summaries(postgres_db, [Forecast])
+    if summary_errors:
+        # The week is gone; retrying the delete refreshes the summary again
+        raise HTTPException(status_code=500, detail={"message": f"Forecast data for week {week_start_date} deleted, filter summary not refreshed", "errors": summary_errors})
+    
+    return {"message": f"Forecast data for week {week_start_date} deleted successfully"}
+
 @router.get("/forecast/table-info")
 async def get_forecast_table_info(
     request: Request,
@@ -504,6 +693,107 @@ async def get_forecast_table_info(
         "columns": columns
     }
 
+# Tables with fewer live rows than this are cheap to scan and never reported as missing an index
+SEQ_SCAN_MIN_ROWS = 10000
+
+@router.get("/indexes")
+async def get_forecast_index_report(
+    request: Request,
+    postgres_db=Depends(get_postgres_db),
+):
+    """
+    Report index usage on the forecast tables and missing-index candidates
+
+    Returns:
+    - indexes: per-index scan counts and size from pg_stat_user_indexes, summed over week partitions
+    - tables: sequential vs index scan counts from pg_stat_user_tables, summed over week partitions
+    - missing_indexes: declared indexes that do not exist yet, and tables where sequential scans dominate
+    - unused_indexes: indexes that have never been scanned
+    """
+    table_names = [model.__tablename__ for model in FORECAST_TABLES]
+
+    # Statistics of week partitions (and their indexes) are rolled up to the partitioned
+    # table they belong to; pg_partition_root is NULL for plain tables
+    index_query = text("""
+    SELECT table_name, index_name, SUM(idx_scan)::bigint AS idx_scan, SUM(idx_tup_read)::bigint AS idx_tup_read,
+           SUM(idx_tup_fetch)::bigint AS idx_tup_fetch, SUM(size_bytes)::bigint AS size_bytes
+    FROM (
+        SELECT COALESCE(pg_partition_root(relid), relid)::regclass::text AS table_name,
+               COALESCE(pg_partition_root(indexrelid), indexrelid)::regclass::text AS index_name,
+               idx_scan, idx_tup_read, idx_tup_fetch, pg_relation_size(indexrelid) AS size_bytes
+        FROM pg_stat_user_indexes
+    ) partition_indexes
+    WHERE table_name = ANY(:table_names)
+    GROUP BY table_name, index_name
+    ORDER BY table_name, index_name
+    """).bindparams(table_names=table_names)
+    table_query = text("""
+    SELECT table_name, SUM(seq_scan)::bigint AS seq_scan, SUM(seq_tup_read)::bigint AS seq_tup_read,
+           SUM(idx_scan)::bigint AS idx_scan, SUM(n_live_tup)::bigint AS n_live_tup
+    FROM (
+        SELECT COALESCE(pg_partition_root(relid), relid)::regclass::text AS table_name,
+               seq_scan, seq_tup_read, idx_scan, n_live_tup
+        FROM pg_stat_user_tables
+    ) partition_tables
+    WHERE table_name = ANY(:table_names)
+    GROUP BY table_name
+    ORDER BY table_name
+    """).bindparams(table_names=table_names)
+
+    index_definitions = request.app.state.postgres_db.index_definitions()
+    # Indexes on partitioned tables have no statistics of their own, so check the catalog
+    existing_query = text("""
+    SELECT relname FROM pg_class WHERE relkind IN ('i', 'I') AND relname = ANY(:index_names)
+    """).bindparams(index_names=[definition["index_name"] for definition in index_definitions])
+
+    index_rows, table_rows, existing_rows = await run_concurrently(
+        postgres_db.fetch_all(index_query),
+        postgres_db.fetch_all(table_query),
+        postgres_db.fetch_all(existing_query),
+    )
+    indexes = [dict(row) for row in index_rows]
+    tables = [dict(row) for row in table_rows]
+
+    existing_indexes = {row["relname"] for row in existing_rows}
+    missing_indexes = []
+    for definition in index_definitions:
+        if definition["index_name"] not in existing_indexes:
+            missing_indexes.append({
+                "table_name": definition["table_name"],
+                "index_name": definition["index_name"],
+                "columns": definition["columns"],
+                "reason": "declared index does not exist, create it with POST /core/indexes",
+            })
+
+    for table in tables:
+        if table["n_live_tup"] >= SEQ_SCAN_MIN_ROWS and table["seq_scan"] > (table["idx_scan"] or 0):
+            missing_indexes.append({
+                "table_name": table["table_name"],
+                "index_name": None,
+                "columns": [],
+                "reason": f"{table['seq_scan']} sequential scans read {table['seq_tup_read']} rows vs {table['idx_scan'] or 0} index scans",
+            })
+
+    unused_indexes = [row for row in indexes if row["idx_scan"] == 0]
+
+    return {
+        "indexes": indexes,
+        "tables": tables,
+        "missing_indexes": missing_indexes,
+        "unused_indexes": unused_indexes,
+    }
+
+@router.post("/indexes")
+async def create_forecast_indexes(
+    request: Request,
+):
+    """
+    Create any missing declared indexes on the forecast tables (CREATE INDEX CONCURRENTLY)
+    """
+    created = await request.app.state.postgres_db.create_indexes()
+
+    return {"created": created}
+
 @router.get("/forecast/filters")
 async def get_forecast_filter_options(
     request: Request,
@@ -513,76 +803,88 @@ async def get_forecast_filter_options(
     Get available filter options for the forecast data with counts
     
     Returns dictionary with field names, their distinct values, and counts for categorical fields
+    
+    Answered from the forecast_filter_summary materialized view, which the load, substitute
+    and delete endpoints refresh (see core/forecast_summary.py).
     """
-    # Define categorical fields to get values for
-    categorical_fields = [
-        "p1_dc", "format", "city", "state", "segment_code", "brick_description",
-        "brand", "segment", "division", "brick_code", "class_code", "division_code",
-        "vertical", "status", "month_year", "region", "family_code", "super_category", 
-        "store_type"
-    ]
+    rows, grouped_fields = await fetch_filter_summary(postgres_db, Forecast)
+    
+    return {
+        "filter_options": collect_filter_options(rows, grouped_fields)
+    }
+
+DEFAULT_FACET_FIELDS = FILTER_CATEGORICAL_FIELDS + ["week_start_date"]
+
+@router.get("/forecast/facets")
+async def get_forecast_facets(
+    request: Request,
+    week_start_date: Optional[str] = None,
+    super_category: Optional[str] = None,
+    store_type: Optional[str] = None,
+    search: Optional[str] = Query(None, description="JSON string for search criteria, as for /forecast"),
+    search_mode: Literal["contains", "prefix"] = Query("contains"),
+    filters: Optional[str] = Query(None, description="JSON string for filter criteria, as for /forecast"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to count values of (default: the categorical filter fields and week_start_date)"),
+    top_k: int = Query(100, ge=1, le=10000, description="Most frequent values returned per field"),
+    field_top_k: Optional[str] = Query(None, description="JSON object of field -> top_k overriding top_k, e.g. {'article_id': 20}"),
+    postgres_db=Depends(get_postgres_db),
+):
+    """
+    Get value counts per field under the active filters and search
     
-    results = {}
+    A field's counts apply every active filter except the field's own, so the values of a
+    filtered field still show what picking them instead would return, and values of other
+    fields only count rows that survive the current selection. Values with no rows are left out.
+    All fields are counted in one scan of the forecast table (one grouping set per field).
     
-    # Query each field for distinct values with counts
-    for field in categorical_fields:
-        if hasattr(Forecast, field):
-            column = getattr(Forecast, field)
-            # Query for distinct values and their counts
-            count_query = select(column, func.count().label('count')).group_by(column).order_by(column)
-            field_results = await postgres_db.fetch_all(count_query)
-            
-            # Extract values, counts and handle None values
-            values = []
-            for row in field_results:
-                value = row[field]
-                count = row['count']
-                if value is not None:
-                    values.append({"value": value, "count": count})
-            
-            results[field] = values
+    Query Parameters:
+    - week_start_date, super_category, store_type, search, search_mode, filters: as for /forecast
+    - fields: fields to facet, at most 31
+    - top_k / field_top_k: values kept per field, most frequent first (ties by value)
+    
+    Returns:
+        {"total": rows matching all filters,
+         "facets": {field: {"values": [{"value", "count"}], "distinct_values": values with rows}}}
+    """
+    spec = parse_forecast_spec(
+        week_start_date=week_start_date,
+        super_category=super_category,
+        store_type=store_type,
+        search=search,
+        search_mode=search_mode,
+        filters=filters,
+    )
     
-    # Add range fields with min/max values
-    range_fields = ["forecast_qty", "consensus_qty", "sold_qty", "wom"]
+    if fields:
+        facet_fields = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    else:
+        facet_fields = DEFAULT_FACET_FIELDS
+    unknown = [field for field in facet_fields if field not in FORECAST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # GROUPING() returns a 32-bit integer with one bit per grouped field
+    if not facet_fields or len(facet_fields) > 31:
+        raise HTTPException(status_code=400, detail="fields must list between 1 and 31 fields")
+    
+    params = dict(spec.params)
+    params["top_k"] = top_k
+    limited_fields = []
+    if field_top_k:
+        for field, limit in parse_json_param(field_top_k, "field_top_k").items():
+            if field not in facet_fields:
+                continue
+            if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+                raise HTTPException(status_code=400, detail=f"field_top_k for {field} must be a positive integer")
+            limited_fields.append(field)
+            params[f"top_k_{field}"] = limit
     
-    for field in range_fields:
-        if hasattr(Forecast, field):
-            column = getattr(Forecast, field)
-            min_query = select(func.min(column))
-            max_query = select(func.max(column))
-            
-            min_value = await postgres_db.fetch_val(min_query)
-            max_value = await postgres_db.fetch_val(max_query)
-            
-            results[field] = {
-                "min": min_value if min_value is not None else 0,
-                "max": max_value if max_value is not None else 0
-            }
-    
-    # Add date ranges
-    date_fields = ["week_start_date"]
-    
-    for field in date_fields:
-        if hasattr(Forecast, field):
-            column = getattr(Forecast, field)
-            # Query for distinct dates and their counts
-            count_query = select(column, func.count().label('count')).group_by(column).order_by(column)
-            field_results = await postgres_db.fetch_all(count_query)
-            
-            # Extract dates, counts and format them
-            values = []
-            for row in field_results:
-                date_val = row[field]
-                count = row['count']
-                if date_val is not None:
-                    # Convert dates to string format
-                    date_str = date_val.isoformat() if isinstance(date_val, date) else str(date_val)
-                    values.append({"value": date_str, "count": count})
-            
-            results[field] = values
+    plan = compile_facet_plan(tuple(spec.conditions), tuple(facet_fields), tuple(sorted(limited_fields)))
+    rows = await fetch_plan(postgres_db, plan, params)
+    total, facets = collect_facets(rows, facet_fields)
     
     return {
-        "filter_options": results
+        "total": total,
+        "facets": facets
     }
 
 class MetricsResponse(BaseModel):
@@ -596,73 +898,229 @@ class MetricsResponse(BaseModel):
     total_qty_predicted: float
     total_qty_baseline: float
 
-@router.get("/forecast/metrics", response_model=MetricsResponse)
+class GroupMetrics(MetricsResponse):
+    group: Dict[str, Any]
+
+class GroupedMetricsResponse(BaseModel):
+    group_by: List[str]
+    overall: MetricsResponse
+    groups: List[GroupMetrics]
+
+def metrics_from_row(row):
+    # Aggregates over no rows are NULL
+    return {
+        key: 0.0 if row[key] is None else row[key]
+        for key in MetricsResponse.model_fields
+    }
+
+@router.get("/forecast/metrics", response_model=Union[MetricsResponse, GroupedMetricsResponse])
 async def get_forecast_metrics(
     request: Request,
+    search: Optional[str] = Query(None, description="JSON string for search criteria, as for /forecast"),
+    search_mode: Literal["contains", "prefix"] = Query("contains"),
+    filters: Optional[str] = Query(None, description="JSON string for filter criteria, as for /forecast"),
+    group_by: Optional[str] = Query(None, description="Comma-separated hierarchy columns to compute the metrics per group, e.g. 'region,super_category'"),
     postgres_db=Depends(get_postgres_db),
 ):
     """
     Get metrics comparing forecast accuracy with baseline (consensus) values
+    
+    Query Parameters:
+    - search, search_mode, filters: restrict the rows as for /forecast
+    - group_by: text or date columns (e.g. region, state, city, super_category, segment,
+      week_start_date). Every group and the overall metrics come from one aggregate query.
+    
+    Returns:
+        The overall metrics, or with group_by {"group_by", "overall", "groups": [{"group", metrics...}]}
     """
-    # Create a subquery to select the fields we need
-    joined_query = select(
-        Forecast.forecast_qty.label('max_qty'),
-        Forecast.consensus_qty.label('baseline_forecast_qty'),
-        Forecast.sold_qty.label('qty_sold'),
-        Forecast.week_start_date,
-        Forecast.region,
-        Forecast.city,
-        Forecast.state,
-        Forecast.p1_dc
-    ).select_from(Forecast)
-    
-    # Create the metrics query using the joined query as a subquery
-    joined_query = joined_query.alias('joined_query')
-    
-    metric_query = (
-        select(
-            # Sum of absolute difference of the quantity sold and predicted quantity
-            func.sum(func.abs(joined_query.c.qty_sold - joined_query.c.max_qty)).label("model_absolute_error"),
-            func.sum(func.abs(joined_query.c.qty_sold - joined_query.c.baseline_forecast_qty)).label(
-                "baseline_absolute_error"),
-            (case(
-                (func.sum(joined_query.c.qty_sold) == 0, 0),
-                else_=func.sum(func.abs(joined_query.c.qty_sold - joined_query.c.max_qty)) * 100 / func.sum(
-                    joined_query.c.qty_sold)
-            )).label("model_percentage_error"),
-            (case(
-                (func.sum(joined_query.c.qty_sold) == 0, 0),
-                else_=func.sum(
-                    func.abs(joined_query.c.qty_sold - joined_query.c.baseline_forecast_qty)) * 100 / func.sum(
-                    joined_query.c.qty_sold)
-            )).label("baseline_percentage_error"),
-            func.sqrt(func.avg(func.pow((joined_query.c.qty_sold - joined_query.c.max_qty), 2))).label('model_rmse'),
-            func.sqrt(func.avg(func.pow((joined_query.c.qty_sold - joined_query.c.baseline_forecast_qty), 2))).label(
-                'baseline_rmse'),
-            func.sum(joined_query.c.qty_sold).label('total_qty_sold'),  # Total quantity sold
-            func.sum(joined_query.c.max_qty).label('total_qty_predicted'), # Total quantity predicted
-            func.sum(joined_query.c.baseline_forecast_qty).label('total_qty_baseline') # Total baseline predicted quantity
-        )
-    )
+    spec = parse_forecast_spec(search=search, search_mode=search_mode, filters=filters)
+    
+    group_fields = []
+    if group_by:
+        group_fields = list(dict.fromkeys(field.strip() for field in group_by.split(",") if field.strip()))
+        invalid = [field for field in group_fields if field not in METRIC_GROUP_FIELDS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Cannot group metrics by: {', '.join(invalid)}")
+        if len(group_fields) > 31:
+            raise HTTPException(status_code=400, detail="group_by takes at most 31 columns")
+    
+    plan = compile_metrics_plan(tuple(spec.conditions), tuple(group_fields))
+    rows = await fetch_plan(postgres_db, plan, spec.params)
+    
+    if not group_fields:
+        if not rows:
+            raise HTTPException(status_code=404, detail="No data found for the specified filters")
+        return metrics_from_row(rows[0])
+    
+    all_grouped = (1 << len(group_fields)) - 1
+    overall = None
+    groups = []
+    for row in rows:
+        if row["grouping_id"] == all_grouped:
+            overall = metrics_from_row(row)
+        else:
+            groups.append({"group": {field: row[field] for field in group_fields}, **metrics_from_row(row)})
+    
+    return {
+        "group_by": group_fields,
+        "overall": overall,
+        "groups": groups
+    }
 
-    # Execute the query
-    metrics_result = await postgres_db.fetch_all(metric_query)
+@router.get("/forecast/metrics/timeseries")
+async def get_forecast_metrics_timeseries(
+    request: Request,
+    week_start_from: Optional[date] = Query(None, description="First week to include"),
+    week_start_to: Optional[date] = Query(None, description="Last week to include"),
+    search: Optional[str] = Query(None, description="JSON string for search criteria, as for /forecast"),
+    search_mode: Literal["contains", "prefix"] = Query("contains"),
+    filters: Optional[str] = Query(None, description="JSON string for filter criteria, as for /forecast"),
+    group_by: Optional[str] = Query(None, description="Comma-separated columns to return one series per group, e.g. 'region'"),
+    deltas: bool = Query(False, description="Add week-over-week changes of every metric"),
+    postgres_db=Depends(get_postgres_db),
+):
+    """
+    Get forecast accuracy per week_start_date, for trend charts
     
-    if not metrics_result or len(metrics_result) == 0:
-        raise HTTPException(status_code=404, detail="No data found for the specified filters")
+    Each point has the /forecast/metrics values of its week plus model_bias / baseline_bias
+    (forecast minus sold quantity) and their percentage of the sold quantity. The whole
+    series comes from one aggregate query, which reads only the weeks in range: the forecast
+    table is partitioned by week and the rollup is indexed on it.
     
-    # Convert to dictionary and handle None values
-    metrics = dict(metrics_result[0])
-    for key, value in metrics.items():
-        if value is None:
-            metrics[key] = 0.0
+    Query Parameters:
+    - week_start_from, week_start_to: inclusive week range
+    - search, search_mode, filters: restrict the rows as for /forecast
+    - group_by: text or date columns; each group gets its own series (and deltas)
+    - deltas: add <metric>_change, the change from the group's previous week with data
+      (null for its first week), computed with window functions in the same query
+    
+    Returns:
+        {"group_by": [...], "series": [{"week_start_date", "group"?, metrics..., changes...}]}
+    """
+    spec = parse_forecast_spec(search=search, search_mode=search_mode, filters=filters)
+    if week_start_from:
+        spec.conditions.append(("gte", "week_start_date", spec.add_param(week_start_from)))
+    if week_start_to:
+        spec.conditions.append(("lte", "week_start_date", spec.add_param(week_start_to)))
+    
+    group_fields = []
+    if group_by:
+        group_fields = list(dict.fromkeys(field.strip() for field in group_by.split(",") if field.strip()))
+        invalid = [field for field in group_fields if field not in METRIC_GROUP_FIELDS or field == "week_start_date"]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Cannot group metrics by: {', '.join(invalid)}")
+    
+    plan = compile_timeseries_plan(tuple(spec.conditions), tuple(group_fields), deltas)
+    rows = await fetch_plan(postgres_db, plan, spec.params)
+    
+    series = []
+    for row in rows:
+        point = {"week_start_date": row["week_start_date"]}
+        if group_fields:
+            point["group"] = {field: row[field] for field in group_fields}
+        for column in plan[2]:
+            if column in point or column in group_fields:
+                continue
+            # Metrics of a week without sold quantities are NULL; changes stay null for a group's first week
+            point[column] = row[column] if row[column] is not None or column.endswith("_change") else 0.0
+        series.append(point)
     
-    return metrics
+    return {
+        "group_by": group_fields,
+        "series": series
+    }
+
+async def run_rollup_rebuild(progress, postgres_db):
+    """Recompute forecast_rollup from the forecast table. Runs as a background job."""
+    await progress.update(current_file=ForecastRollup.__tablename__)
+    await rebuild_rollup(postgres_db)
+    rollup_rows = await postgres_db.fetch_val(select(func.count()).select_from(ForecastRollup))
+    await progress.update(rows=rollup_rows)
+    return {"rollup_rows": rollup_rows}
+
+@router.post("/forecast/rollup/rebuild", response_model=JobSubmittedResponse, status_code=202)
+async def rebuild_forecast_rollup(
+    postgres_db=Depends(get_postgres_db),
+    job_manager=Depends(get_job_manager),
+):
+    """
+    Recompute forecast_rollup from the forecast table
+    
+    Loads and deletes keep the rollup in step in their own transactions; this repairs it
+    after the forecast table was written some other way (e.g. through SQL). Runs as a
+    background job; poll GET /jobs/{job_id}.
+    """
+    job_id = await job_manager.submit("rebuild-rollup", run_rollup_rebuild, postgres_db)
+    return job_submitted_response(job_id)
+
+async def run_variant_rebuild(progress, postgres_db, weeks=None):
+    """Unpack forecast_new's variant forecasts into forecast_new_variant_qty. Runs as a background job."""
+    await progress.update(current_file=ForecastVariantQty.__tablename__)
+    variant_rows = await rebuild_variant_qty(postgres_db, weeks)
+    await progress.update(rows=variant_rows)
+    return {"variant_rows": variant_rows}
+
+@router.post("/forecast/variants/rebuild", response_model=JobSubmittedResponse, status_code=202)
+async def rebuild_forecast_variants(
+    week_start_date: Optional[List[date]] = Query(None, description="Only rebuild these weeks (repeat the parameter for several)"),
+    postgres_db=Depends(get_postgres_db),
+    job_manager=Depends(get_job_manager),
+):
+    """
+    Refresh the numeric variant table (forecast_new_variant_qty) from forecast_new's
+    forecast_qty JSON, after forecast_new was written
+    
+    The JSON objects are unpacked by Postgres in one INSERT ... SELECT. Runs as a
+    background job; poll GET /jobs/{job_id}.
+    """
+    job_id = await job_manager.submit("rebuild-variants", run_variant_rebuild, postgres_db, weeks=week_start_date)
+    return job_submitted_response(job_id)
+
+@router.get("/forecast/variants/scores")
+async def get_forecast_variant_scores(
+    request: Request,
+    group_by: Optional[str] = Query(None, description="Comma-separated columns to score per group: channel, region, super_category, store_type, week_start_date"),
+    week_start_from: Optional[date] = Query(None, description="First week to score"),
+    week_start_to: Optional[date] = Query(None, description="Last week to score"),
+    postgres_db=Depends(get_postgres_db),
+):
+    """
+    Score every forecast_new model variant against sold_qty
+    
+    One aggregate over forecast_new_variant_qty joined to its forecast_new rows returns, per
+    variant (and group), mae, rmse, bias (mean forecast minus sold), wape (absolute error as
+    a percentage of the sold quantity) and the quantity totals. Rows without a sold quantity
+    or without the variant's forecast are not scored.
+    
+    Returns:
+        {"group_by": [...], "scores": [{"variant", "group"?, "scored_rows", "mae", "rmse", "bias", "wape", ...}]}
+    """
+    group_fields = []
+    if group_by:
+        group_fields = list(dict.fromkeys(field.strip() for field in group_by.split(",") if field.strip()))
+        invalid = [field for field in group_fields if field not in VARIANT_GROUP_FIELDS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Cannot group variant scores by: {', '.join(invalid)}")
+    
+    rows = await postgres_db.fetch_all(variant_scores_query(group_fields, week_start_from, week_start_to))
+    
+    scores = []
+    for row in rows:
+        score = dict(row)
+        if group_fields:
+            score["group"] = {field: score.pop(field) for field in group_fields}
+        scores.append(score)
+    
+    return {
+        "group_by": group_fields,
+        "scores": scores
+    }
 
 @router.get("/forecast-table-sql")
 async def execute_forecast_sql_query(
     request: Request,
     sql_query: str = Query(..., description="Raw SQL query to execute against forecast table"),
+    response_format: Literal["json", "arrow", "parquet"] = Query("json", alias="format", description="arrow/parquet return the result rows as a columnar body"),
     postgres_db=Depends(get_postgres_db),
 ):
     """
@@ -670,6 +1128,9 @@ async def execute_forecast_sql_query(
     
     Parameters:
     - sql_query: Raw SQL query string (e.g., 'SELECT * FROM forecast LIMIT 20')
+    - format: "arrow" (Arrow IPC stream) or "parquet" returns only the result rows as a columnar
+      body (also selected by an Accept header of application/vnd.apache.arrow.stream or
+      application/vnd.apache.parquet). Column types are inferred from the values
     
     Note: For security, only SELECT queries are allowed and the query must reference the 'forecast' table
     """
@@ -705,14 +1166,27 @@ async def execute_forecast_sql_query(
         query_obj = text(sql_query)
         results = await postgres_db.fetch_all(query_obj)
         
-        # Convert results to list of dictionaries with proper date handling
-        items = [row_to_dict(row) for row in results]
+        columnar_format = negotiate_columnar_format(request, response_format)
+        if columnar_format:
+            column_names = list(results[0].keys()) if results else []
+            try:
+                table = rows_to_arrow(results, column_names)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return ColumnarResponse(
+                table,
+                columnar_format,
+                filename="forecast_query",
+                headers={"X-Result-Count": str(len(results))}
+            )
+        
+        items = rows_to_dicts(results)
         
-        return {
+        return FastJSONResponse({
             "query": sql_query,
             "result_count": len(items),
             "data": items
-        }
+        })
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -940,10 +1414,7 @@ async def get_all_analytics_pages(
     query = select(AnalyticsPageConfiguration)
     results = await postgres_db.fetch_all(query)
     
-    # Convert database rows to dictionaries with proper handling
-    items = [row_to_dict(row) for row in results]
-    
-    return items
+    return FastJSONResponse(rows_to_dicts(results))
 
 @router.post("/analytics-pages", response_model=AnalyticsPageConfigurationResponse)
 async def create_analytics_page(
@@ -971,7 +1442,7 @@ async def create_analytics_page(
     query = select(AnalyticsPageConfiguration).where(AnalyticsPageConfiguration.id == result)
     created_record = await postgres_db.fetch_one(query)
     
-    return row_to_dict(created_record)
+    return FastJSONResponse(dict(created_record))
 
 @router.put("/analytics-pages/{page_id}", response_model=AnalyticsPageConfigurationResponse)
 async def update_analytics_page(
@@ -1015,7 +1486,7 @@ async def update_analytics_page(
     # Get the updated record
     updated_record = await postgres_db.fetch_one(query)
     
-    return row_to_dict(updated_record)
+    return FastJSONResponse(dict(updated_record))
 
 @router.delete("/analytics-pages/{page_id}")
 async def delete_analytics_page(
@@ -1058,7 +1529,7 @@ async def get_analytics_page(
     if not result:
         raise HTTPException(status_code=404, detail="Analytics page not found")
     
-    return row_to_dict(result)
+    return FastJSONResponse(dict(result))
 
 @router.get("/analytics-pages/name/{page_name}", response_model=AnalyticsPageConfigurationResponse)
 async def get_analytics_page_by_name(
@@ -1077,4 +1548,4 @@ async def get_analytics_page_by_name(
     if not result:
         raise HTTPException(status_code=404, detail="Analytics page not found")
     
-    return row_to_dict(result)
+    return FastJSONResponse(dict(result))
@@ -0,0 +1,158 @@
+"""
+Week partitions of the forecast tables.
+
+The forecast tables are range partitioned on week_start_date with one partition per
+week_start_date value, named {table}_wYYYYMMDD, plus a {table}_default partition that
+catches rows for weeks without a partition. A new week is loaded into a standalone table
+that is attached when complete, and a week is dropped by dropping its partition.
+
+The *_sql functions only build statements, so they can run on the sync engine at startup
+and on the async databases connection in the loader.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+
+def week_partition_name(table_name, week_start_date):
+    return f"{table_name}_w{week_start_date:%Y%m%d}"
+
+
+def default_partition_name(table_name):
+    return f"{table_name}_default"
+
+
+def week_bounds(week_start_date):
+    """Range bounds of a week's partition: just its week_start_date value"""
+    return week_start_date.isoformat(), (week_start_date + timedelta(days=1)).isoformat()
+
+
+def is_partitioned_sql(table_name):
+    return text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table_name)").bindparams(
+        table_name=table_name
+    )
+
+
+def list_partitions_sql(table_name):
+    return text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table_name)"
+    ).bindparams(table_name=table_name)
+
+
+def partition_index_name(index_name, table_name, partition_name):
+    """Name of a partition's piece of a parent index, e.g. ix_forecast_store_week_w20241201"""
+    return f"{index_name}_{partition_name[len(table_name) + 1:]}"
+
+
+def unindexed_partitions_sql(table_name, index_name):
+    """Partitions with no index attached to the parent's index_name yet"""
+    return text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table_name) AND NOT EXISTS ("
+        "SELECT 1 FROM pg_inherits ii JOIN pg_index x ON x.indexrelid = ii.inhrelid "
+        "WHERE ii.inhparent = to_regclass(:index_name) AND x.indrelid = c.oid)"
+    ).bindparams(table_name=table_name, index_name=index_name)
+
+
+def create_default_partition_sql(table_name):
+    return text(f"CREATE TABLE IF NOT EXISTS {default_partition_name(table_name)} PARTITION OF {table_name} DEFAULT")
+
+
+def create_staging_table_sql(table_name, week_start_date):
+    """
+    Standalone table shaped like the parent. It has no indexes, so bulk loads into it are
+    cheap; the parent's indexes are built on it when it is attached.
+    """
+    name = week_partition_name(table_name, week_start_date)
+    lower, upper = week_bounds(week_start_date)
+    return [
+        text(f"DROP TABLE IF EXISTS {name}"),
+        text(f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"),
+        # Lets ATTACH PARTITION skip scanning the table to validate the bounds
+        text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK "
+            f"(week_start_date IS NOT NULL AND week_start_date >= DATE '{lower}' AND week_start_date < DATE '{upper}')"
+        ),
+    ]
+
+
+def attach_week_partition_sql(table_name, week_start_date):
+    """
+    Move the week's rows out of the default partition into the staging table, then attach it
+    """
+    name = week_partition_name(table_name, week_start_date)
+    default_name = default_partition_name(table_name)
+    lower, upper = week_bounds(week_start_date)
+    return [
+        text(f"INSERT INTO {name} SELECT * FROM {default_name} WHERE week_start_date = DATE '{lower}'"),
+        text(f"DELETE FROM {default_name} WHERE week_start_date = DATE '{lower}'"),
+        text(f"ALTER TABLE {table_name} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"),
+    ]
+
+
+def drop_week_partition_sql(table_name, week_start_date):
+    """Dropping a partition detaches it and frees its storage without touching other weeks"""
+    return text(f"DROP TABLE IF EXISTS {week_partition_name(table_name, week_start_date)}")
+
+
+def default_partition_weeks_sql(table_name):
+    return text(f"SELECT DISTINCT week_start_date FROM {default_partition_name(table_name)} WHERE week_start_date IS NOT NULL")
+
+
+def parse_week_partition(table_name, partition_name):
+    """week_start_date of a {table}_wYYYYMMDD partition, or None for other partitions"""
+    prefix = f"{table_name}_w"
+    if not partition_name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(partition_name[len(prefix):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+async def is_partitioned(database, table_name):
+    return bool(await database.fetch_val(is_partitioned_sql(table_name)))
+
+
+async def list_week_partitions(database, table_name):
+    """Attached week partitions as {week_start_date: partition name}"""
+    rows = await database.fetch_all(list_partitions_sql(table_name))
+    weeks = {}
+    for row in rows:
+        week_start_date = parse_week_partition(table_name, row["relname"])
+        if week_start_date:
+            weeks[week_start_date] = row["relname"]
+    return weeks
+
+
+async def create_staging_table(database, table_name, week_start_date):
+    """
+    Returns:
+        Name of the standalone table to load the week into
+    """
+    async with database.transaction():
+        for statement in create_staging_table_sql(table_name, week_start_date):
+            await database.execute(statement)
+    return week_partition_name(table_name, week_start_date)
+
+
+async def attach_week_partition(connection, table_name, week_start_date):
+    """Attach a loaded staging table. Run inside the caller's transaction."""
+    for statement in attach_week_partition_sql(table_name, week_start_date):
+        await connection.execute(statement)
+
+
+async def drop_week_partitions(database, table_name, weeks=None):
+    """
+    Drop the given week partitions, or all of them when weeks is None
+
+    Returns:
+        List of dropped week_start_date values
+    """
+    if weeks is None:
+        weeks = list(await list_week_partitions(database, table_name))
+    for week_start_date in weeks:
+        await database.execute(drop_week_partition_sql(table_name, week_start_date))
+    return weeks
@@ -1,8 +1,24 @@
+import asyncio
 import databases
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text, select
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
 from auth.schema import Token, UserRole, User, AppToken
-from schema import Forecast, AnalyticsPageConfiguration, ForecastFnl, ForecastVariants
+from db.partitions import (
+    is_partitioned_sql,
+    create_default_partition_sql,
+    default_partition_weeks_sql,
+    create_staging_table_sql,
+    attach_week_partition_sql,
+    partition_index_name,
+    unindexed_partitions_sql,
+)
+from core.forecast_summary import SUMMARY_MODELS, create_filter_summary_sql, filter_summary_name
+from core.forecast_rollup import rollup_insert
+from core.forecast_variants import variant_qty_insert
+from schema import Forecast, AnalyticsPageConfiguration, ForecastFnl, ForecastVariants, ForecastLoadManifest, BackgroundJob, ForecastRollup, ForecastVariantQty, FORECAST_SEARCH_COLUMNS
+
+FORECAST_TABLES = [Forecast, ForecastFnl, ForecastVariants]
 
 
 class PostgresDatabase:
@@ -56,4 +72,195 @@ class PostgresDatabase:
         AnalyticsPageConfiguration.__table__.create(bind=self.postgres_engine, checkfirst=True)
         ForecastFnl.__table__.create(bind=self.postgres_engine, checkfirst=True)
         ForecastVariants.__table__.create(bind=self.postgres_engine, checkfirst=True)
+        ForecastLoadManifest.__table__.create(bind=self.postgres_engine, checkfirst=True)
+        BackgroundJob.__table__.create(bind=self.postgres_engine, checkfirst=True)
+        ForecastRollup.__table__.create(bind=self.postgres_engine, checkfirst=True)
+        ForecastVariantQty.__table__.create(bind=self.postgres_engine, checkfirst=True)
+        self.create_forecast_partitions()
+        self.create_filter_summaries()
+        self.fill_forecast_rollup()
+        self.fill_variant_qty()
         print("Postgres table created")
+
+    def create_forecast_partitions(self):
+        """
+        Create the default partition of each partitioned forecast table, and move rows that
+        were written to it (weeks that had no partition yet) into their own week partitions.
+        Each table is handled in one transaction under an advisory lock.
+        """
+        for model in FORECAST_TABLES:
+            table_name = model.__tablename__
+            with self.postgres_engine.begin() as conn:
+                # Workers start together; the others wait and then find the rows moved
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": f"{table_name}_partitions"})
+                if not conn.execute(is_partitioned_sql(table_name)).scalar():
+                    # Tables created before partitioning was introduced stay plain tables
+                    # until they are dropped and reloaded
+                    print(f"Table {table_name} is not partitioned by week_start_date")
+                    continue
+                conn.execute(create_default_partition_sql(table_name))
+                weeks = conn.execute(default_partition_weeks_sql(table_name)).scalars().all()
+
+                for week_start_date in weeks:
+                    for statement in create_staging_table_sql(table_name, week_start_date) + attach_week_partition_sql(table_name, week_start_date):
+                        conn.execute(statement)
+                    print(f"Moved {table_name} rows for {week_start_date} into their own partition")
+
+    def create_filter_summaries(self):
+        """
+        Create the filter summary materialized views of the forecast tables. Creating one
+        scans its table once; after that the ingest endpoints refresh it.
+        """
+        for model in SUMMARY_MODELS:
+            with self.postgres_engine.begin() as conn:
+                # Workers start together; the others wait and then find the view created
+                conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": filter_summary_name(model.__tablename__)})
+                for statement in create_filter_summary_sql(model):
+                    conn.execute(statement)
+
+    def fill_forecast_rollup(self):
+        """
+        Fill the forecast rollup from the forecast table when it is empty (first start, or
+        data loaded before the rollup existed). After that the load and delete endpoints
+        keep it in step.
+        """
+        with self.postgres_engine.begin() as conn:
+            # Workers start together; only the first one fills the rollup
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": ForecastRollup.__tablename__})
+            if conn.execute(select(ForecastRollup.id).limit(1)).first() is None:
+                result = conn.execute(rollup_insert())
+                if result.rowcount:
+                    print(f"Filled {ForecastRollup.__tablename__} with {result.rowcount} rows")
+
+    def fill_variant_qty(self):
+        """
+        Unpack forecast_new's variant forecasts into forecast_new_variant_qty when it is empty.
+        After that, POST /core/forecast/variants/rebuild refreshes it.
+        """
+        with self.postgres_engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": ForecastVariantQty.__tablename__})
+            if conn.execute(select(ForecastVariantQty.id).limit(1)).first() is None:
+                result = conn.execute(variant_qty_insert())
+                if result.rowcount:
+                    print(f"Filled {ForecastVariantQty.__tablename__} with {result.rowcount} rows")
+
+    def index_definitions(self):
+        """
+        Indexes managed by create_indexes: the composite B-tree indexes declared on the
+        forecast models plus pg_trgm GIN indexes on the searchable forecast columns
+
+        Returns:
+            List of dicts with table_name, index_name, columns, extension and ddl
+        """
+        definitions = []
+        for model in FORECAST_TABLES:
+            for index in model.__table__.indexes:
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=self.postgres_engine.dialect))
+                definitions.append({
+                    "table_name": model.__tablename__,
+                    "index_name": index.name,
+                    "columns": [column.name for column in index.columns],
+                    "extension": None,
+                    "ddl": ddl,
+                })
+
+        table_name = Forecast.__tablename__
+        for field in FORECAST_SEARCH_COLUMNS:
+            column_name = getattr(Forecast, field).expression.name
+            index_name = f"ix_{table_name}_{column_name}_trgm"
+            definitions.append({
+                "table_name": table_name,
+                "index_name": index_name,
+                "columns": [column_name],
+                "extension": "pg_trgm",
+                "ddl": f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} USING gin ("{column_name}" gin_trgm_ops)',
+            })
+        return definitions
+
+    def create_indexes_sync(self):
+        """
+        Create the managed indexes without blocking writes to existing tables. Plain tables
+        get CREATE INDEX CONCURRENTLY. Partitioned tables can't build an index concurrently,
+        so the index is created ON ONLY the parent, each partition's index is built
+        concurrently and attached to it, and the parent index turns valid once every
+        partition has one. Invalid leftovers from an interrupted build are dropped and rebuilt.
+
+        Returns:
+            List of index names that were created
+        """
+        created = []
+        extensions = {}
+        # CONCURRENTLY cannot run inside a transaction block
+        with self.postgres_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+
+            def index_valid(index_name):
+                # None when the index doesn't exist
+                return conn.execute(
+                    text(
+                        "SELECT i.indisvalid FROM pg_index i "
+                        "JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE c.relname = :name"
+                    ),
+                    {"name": index_name},
+                ).scalar()
+
+            def build_concurrently(index_name, ddl):
+                if index_valid(index_name) is False:
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+                conn.execute(text(ddl.replace("INDEX", "INDEX CONCURRENTLY", 1)))
+
+            # Session-level, since each statement commits on its own. Another process building
+            # the same indexes would see them invalid mid-build and drop them, so skip instead
+            lock = {"name": "create_indexes"}
+            if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), lock).scalar():
+                print("Indexes are being created by another process, skipping")
+                return created
+            try:
+                partitioned_tables = {
+                    model.__tablename__
+                    for model in FORECAST_TABLES
+                    if conn.execute(is_partitioned_sql(model.__tablename__)).scalar()
+                }
+                for definition in self.index_definitions():
+                    table_name = definition["table_name"]
+                    index_name = definition["index_name"]
+                    extension = definition["extension"]
+                    ddl = definition["ddl"]
+                    if extension and extension not in extensions:
+                        try:
+                            conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+                            extensions[extension] = True
+                        except Exception as e:
+                            print(f"Extension {extension} is not available, skipping its indexes: {str(e)}")
+                            extensions[extension] = False
+                    if extension and not extensions[extension]:
+                        continue
+                    if index_valid(index_name):
+                        continue
+
+                    try:
+                        if table_name not in partitioned_tables:
+                            build_concurrently(index_name, ddl)
+                        else:
+                            # The parent's index stays invalid until every partition has one attached
+                            conn.execute(text(ddl.replace(f" ON {table_name} ", f" ON ONLY {table_name} ", 1)))
+                            partitions = conn.execute(unindexed_partitions_sql(table_name, index_name)).scalars().all()
+                            for partition_name in partitions:
+                                partition_index = partition_index_name(index_name, table_name, partition_name)
+                                if not index_valid(partition_index):
+                                    build_concurrently(
+                                        partition_index,
+                                        ddl.replace(f" {index_name} ", f" {partition_index} ", 1)
+                                        .replace(f" ON {table_name} ", f" ON {partition_name} ", 1),
+                                    )
+                                conn.execute(text(f'ALTER INDEX "{index_name}" ATTACH PARTITION "{partition_index}"'))
+                        created.append(index_name)
+                        print(f"Created index {index_name}")
+                    except Exception as e:
+                        print(f"Error creating index {index_name}: {str(e)}")
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), lock)
+        return created
+
+    async def create_indexes(self):
+        return await asyncio.to_thread(self.create_indexes_sync)
@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 from starlette.status import HTTP_401_UNAUTHORIZED
 from db import PostgresDatabase
@@ -14,6 +15,7 @@ from core.routes import router as core_router
 from settings import Settings
 from auth.routes.init_script import init_router
 from utils.upload import router as utils_router
+from core.jobs import router as jobs_router, JobManager
 from db import AsyncClickHouseConnection, RedisDatabase
 
 
@@ -41,6 +43,14 @@ async def lifespan(app: FastAPI):
 
     await database.create_tables()
 
+    # load-data and substitute run as background jobs, at most max_concurrent_jobs at a time
+    app.state.job_manager = JobManager(database.database, settings.max_concurrent_jobs)
+    app.state.job_manager.start()
+
+    if settings.create_indexes_on_startup:
+        # index builds on large tables can take minutes, don't block startup on them
+        app.state.index_task = asyncio.create_task(database.create_indexes())
+
     print("Loading Completed !")
     yield
 
@@ -117,6 +127,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination metadata of Arrow/Parquet responses from /core/forecast
+    expose_headers=["X-Total-Count", "X-Total-Is-Exact", "X-Next-Cursor", "X-Result-Count"],
 )
 
 
@@ -130,6 +142,7 @@ app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(core_router)
 app.include_router(utils_router)
+app.include_router(jobs_router)
 
 app.include_router(init_router)
 
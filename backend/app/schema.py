@@ -10,6 +10,9 @@ from sqlalchemy import (
     Boolean,
     ARRAY,
     Date,
+    Index,
+    BigInteger,
+    UniqueConstraint,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -80,8 +83,39 @@ Base = declarative_base()
 #     feedback = Column(String)
 #     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
+# Forecast columns served by pg_trgm GIN indexes for the grid search box
+FORECAST_SEARCH_COLUMNS = [
+    "article_description",
+    "article_id",
+    "brand",
+    "city",
+    "store_no",
+    "brick_description",
+    "class_description",
+]
+
+
+def forecast_indexes(table_name):
+    """
+    Composite indexes shared by the forecast fact tables, covering the columns
+    the grid, load and analytics paths filter on
+    """
+    return (
+        Index(f"ix_{table_name}_week_category_type", "week_start_date", "super_category", "store_type"),
+        Index(f"ix_{table_name}_store_week", "store_no", "week_start_date"),
+        Index(f"ix_{table_name}_article_week", "article_id", "week_start_date"),
+        Index(f"ix_{table_name}_region_week", "region", "week_start_date"),
+    )
+
+
+# Forecast fact tables get one range partition per week_start_date (see db/partitions.py).
+# Postgres requires the partition key in the primary key, so it is (id, week_start_date).
+FORECAST_PARTITIONING = {"postgresql_partition_by": "RANGE (week_start_date)"}
+
+
 class Forecast(Base):
     __tablename__ = "forecast"
+    __table_args__ = forecast_indexes("forecast") + (FORECAST_PARTITIONING,)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     p1_dc = Column(String)
@@ -116,7 +150,7 @@ class Forecast(Base):
     sold_qty = Column(Float)
     
     # Additional columns
-    week_start_date = Column(Date)
+    week_start_date = Column(Date, primary_key=True)
     super_category = Column(String)
     store_type = Column(String)  # online/offline
     
@@ -124,6 +158,77 @@ class Forecast(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+# forecast totals per week x region x state x super_category x segment x brand x store_type,
+# kept in step with forecast by core/forecast_rollup.py for the aggregate endpoints
+class ForecastRollup(Base):
+    __tablename__ = "forecast_rollup"
+    __table_args__ = (
+        Index("ix_forecast_rollup_week_category_type", "week_start_date", "super_category", "store_type"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    week_start_date = Column(Date, nullable=False)
+    region = Column(String)
+    state = Column(String)
+    super_category = Column(String)
+    segment = Column(String)
+    brand = Column(String)
+    store_type = Column(String)
+
+    row_count = Column(BigInteger)
+    forecast_qty_sum = Column(Float)
+    consensus_qty_sum = Column(Float)
+    sold_qty_sum = Column(Float)
+    # Error components of the model (forecast_qty) and baseline (consensus_qty) against sold_qty;
+    # *_error_rows count the rows where both quantities are present
+    model_absolute_error = Column(Float)
+    baseline_absolute_error = Column(Float)
+    model_squared_error = Column(Float)
+    baseline_squared_error = Column(Float)
+    model_error_rows = Column(BigInteger)
+    baseline_error_rows = Column(BigInteger)
+
+
+# one row per loaded forecast partition (week_start_date/family/channel_online_offline directory)
+class ForecastLoadManifest(Base):
+    __tablename__ = "forecast_load_manifest"
+    __table_args__ = (
+        UniqueConstraint("week_start_date", "super_category", "store_type", name="uq_forecast_load_manifest_partition"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    week_start_date = Column(Date, nullable=False)
+    super_category = Column(String, nullable=False)
+    store_type = Column(String, nullable=False)
+    partition_path = Column(String)
+    files = Column(JSON)  # [{"path": ..., "size": ..., "mtime": ...}] of the part files
+    file_size = Column(BigInteger)
+    file_mtime = Column(Float)
+    checksum = Column(String)  # sha256 over the part files' contents
+    success_marker = Column(Boolean)
+    row_count = Column(Integer)
+    loaded_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# long running ingest jobs, polled through GET /jobs/{job_id}
+class BackgroundJob(Base):
+    __tablename__ = "background_job"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String)  # load-data / substitute / convert-parquet / rebuild-rollup / rebuild-variants
+    status = Column(String)  # queued / running / succeeded / failed
+    rows_processed = Column(BigInteger, default=0)
+    current_file = Column(String)
+    errors = Column(JSON)
+    result = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    # Renewed by the worker running the job; a queued or running job past it was interrupted
+    lease_expires_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 # analytics page configuration table
 class AnalyticsPageConfiguration(Base):
     __tablename__ = "analytics_page_configuration"
@@ -136,6 +241,7 @@ class AnalyticsPageConfiguration(Base):
 
 class ForecastFnl(Base):
     __tablename__ = "forecast_fnl"
+    __table_args__ = forecast_indexes("forecast_fnl") + (FORECAST_PARTITIONING,)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     p1_dc = Column(String)
@@ -170,7 +276,7 @@ class ForecastFnl(Base):
     sold_qty = Column(Float)
     
     # Additional columns
-    week_start_date = Column(Date)
+    week_start_date = Column(Date, primary_key=True)
     super_category = Column(String)
     store_type = Column(String)  # online/offline
     
@@ -181,6 +287,7 @@ class ForecastFnl(Base):
 
 class ForecastVariants(Base):
     __tablename__ = "forecast_new"
+    __table_args__ = forecast_indexes("forecast_new") + (FORECAST_PARTITIONING,)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     p1_dc = Column(String)
@@ -215,7 +322,7 @@ class ForecastVariants(Base):
     sold_qty = Column(Float)
     
     # Additional columns
-    week_start_date = Column(Date)
+    week_start_date = Column(Date, primary_key=True)
     super_category = Column(String)
     store_type = Column(String)  # online/offline
     # channel is Character varying 255
@@ -224,3 +331,19 @@ class ForecastVariants(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+
+# forecast_new's forecast_qty JSON ({variant name: quantity}) as one numeric row per
+# variant, filled by core/forecast_variants.py so variants are scored in SQL
+class ForecastVariantQty(Base):
+    __tablename__ = "forecast_new_variant_qty"
+    __table_args__ = (
+        UniqueConstraint("week_start_date", "forecast_id", "variant", name="uq_forecast_new_variant_qty_row_variant"),
+        Index("ix_forecast_new_variant_qty_variant_week", "variant", "week_start_date"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # (forecast_id, week_start_date) is the forecast_new row's primary key
+    forecast_id = Column(Integer, nullable=False)
+    week_start_date = Column(Date, nullable=False)
+    variant = Column(String, nullable=False)
+    forecast_qty = Column(Float)
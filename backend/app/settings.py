@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -9,6 +10,15 @@ class Settings(BaseSettings):
     postgres_service: str
     uvicorn_workers: str
 
+    # build missing forecast indexes in the background at startup
+    create_indexes_on_startup: bool = True
+
+    # worker processes for parsing CSV files in /core/load-data (default: CPU count)
+    load_workers: Optional[int] = None
+
+    # heavy background jobs (load-data, substitute) running at once per uvicorn worker
+    max_concurrent_jobs: int = 1
+
     # redis_db: int = 0
     # redis_host: str
     # redis_port: int
@@ -1,5 +1,12 @@
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
 from databases import Database
 from fastapi import Request
+from fastapi.responses import Response
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # from models import QuerySuggestorModel
 from settings import Settings
@@ -15,6 +22,121 @@ def get_postgres_db(request: Request) -> Database:
     return request.app.state.postgres_db.database
 
 
+# Upper bound on concurrent queries issued by one request, so it can't take over the pool
+MAX_CONCURRENT_QUERIES = 4
+
+
+async def run_concurrently(*coroutines, limit: int = MAX_CONCURRENT_QUERIES):
+    """
+    Await independent database coroutines concurrently and return their results in order.
+
+    Each coroutine runs in its own task, and databases gives every task its own pooled
+    connection, so the queries execute in parallel instead of back to back.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+def _orjson_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    # Like json.dumps, don't guess a representation for unknown types
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_dumps(content) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoded with orjson, which serializes date/datetime natively.
+    Returning it from a route skips response_model validation, so use it only for
+    payloads built from trusted database rows.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
+
+def rows_to_dicts(rows):
+    """Convert database rows to plain dicts, leaving value conversion to FastJSONResponse"""
+    return [dict(row) for row in rows]
+
+
+COLUMNAR_MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def negotiate_columnar_format(request: Request, requested_format: str = None):
+    """
+    Pick a columnar response format from an explicit format parameter or the Accept header.
+
+    Returns:
+        "arrow", "parquet", or None when the client did not ask for a columnar body
+    """
+    if requested_format in COLUMNAR_MEDIA_TYPES:
+        return requested_format
+
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *media_params = [part.strip().lower() for part in media_range.split(";")]
+        if "q=0" in media_params:
+            continue
+        for columnar_format, columnar_media_type in COLUMNAR_MEDIA_TYPES.items():
+            if media_type == columnar_media_type:
+                return columnar_format
+    return None
+
+
+def rows_to_arrow(rows, column_names, schema: pa.Schema = None) -> pa.Table:
+    """
+    Build an Arrow table column by column from database rows, without going
+    through per-row dicts. Types are taken from schema when given, else inferred.
+    Columns are read by position, so duplicate column names are kept.
+    Raises ValueError naming the column if its values can't be converted.
+    """
+    arrays = []
+    for index, name in enumerate(column_names):
+        column = [row[index] for row in rows]
+        try:
+            arrays.append(pa.array(column, type=schema.field(index).type if schema is not None else None))
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"Column {name!r} cannot be converted to Arrow: {e}") from e
+    if schema is None:
+        return pa.table(arrays, names=column_names)
+    return pa.table(arrays, schema=schema)
+
+
+class ColumnarResponse(Response):
+    """Arrow IPC stream or Parquet file body for an Arrow table"""
+
+    def __init__(self, table: pa.Table, columnar_format: str, filename: str, headers: dict = None):
+        sink = pa.BufferOutputStream()
+        if columnar_format == "parquet":
+            pq.write_table(table, sink)
+        else:
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        headers = dict(headers or {})
+        headers["Content-Disposition"] = f"attachment; filename={filename}.{columnar_format}"
+        super().__init__(
+            content=sink.getvalue().to_pybytes(),
+            media_type=COLUMNAR_MEDIA_TYPES[columnar_format],
+            headers=headers,
+        )
+
+
 def get_clickhouse_db(request: Request) -> AsyncClickHouseConnection:
     return request.app.state.clickhouse_db
 
@@ -0,0 +1,317 @@
+"""
+Synthetic forecast data for load testing /core/load-data and /utils/substitute.
+
+Writes a Hive-partitioned week_start_date=/family=/channel_online_offline= tree like the
+real drop: the same CSV header, Spark-style part file names and _SUCCESS markers, as CSV
+or Snappy Parquet. Optionally writes a catalog Parquet file for part of the generated
+articles, in the shape /utils/substitute reads.
+
+Run from backend/app:
+    python -m utils.forecast_generator --output-dir data_synthetic --weeks 4 --rows-per-partition 200000
+"""
+
+from datetime import date, timedelta
+from pathlib import Path
+from uuid import uuid4
+import argparse
+import shutil
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# Column order of the part-*.csv files in the real drop
+FORECAST_CSV_COLUMNS = [
+    'p1_dc', 'format', 'city', 'state', 'segment_code', 'consensus_qty', 'brick_description',
+    'forecast_qty', 'brand', 'segment', 'division', 'brick_code', 'class_code', 'division_code',
+    'vertical', 'store_no', 'batchno', 'status', 'article_id', 'month_year', 'pin_code', 'region',
+    'wom', 'family_code', 'class', 'sd', 'article_description', 'kvi', 'npi', 'sold_qty',
+]
+
+FAMILIES = [
+    "HETV", "HOME CARE", "FOOD PRESERVATION", "KITCHEN CARE", "WIRELESS PHONES", "LAPTOPS",
+    "AUDIO", "CAMERAS", "SMALL APPLIANCES", "LARGE APPLIANCES", "GROCERY", "PERSONAL CARE",
+]
+
+# (city, state, region, pin code prefix)
+CITIES = [
+    ("Hyderabad", "Telangana", "South", "500"),
+    ("Bengaluru", "Karnataka", "South", "560"),
+    ("Chennai", "Tamil Nadu", "South", "600"),
+    ("Mumbai", "Maharashtra", "West", "400"),
+    ("Pune", "Maharashtra", "West", "411"),
+    ("Ahmedabad", "Gujarat", "West", "380"),
+    ("Delhi", "Delhi", "North", "110"),
+    ("Lucknow", "Uttar Pradesh", "North", "226"),
+    ("Jaipur", "Rajasthan", "North", "302"),
+    ("Kolkata", "West Bengal", "East", "700"),
+    ("Patna", "Bihar", "East", "800"),
+    ("Bhubaneswar", "Odisha", "East", "751"),
+]
+
+STORE_FORMATS = ["DIGITAL DC", "DIGITAL STORE", "DIGITAL MINI", "SMART BAZAAR"]
+BRANDS = ["Prestige", "Samsung", "LG", "Sony", "Philips", "Bajaj", "Havells", "Panasonic", "Boat", "Reconnect"]
+BRICKS = [
+    "CANNISTER VACUM CLNR", "LED TV", "REFRIGERATOR", "MIXER GRINDER", "SMARTPHONE",
+    "AIR FRYER", "SOUNDBAR", "WASHING MACHINE", "MICROWAVE", "WATER PURIFIER",
+]
+
+# Rows written per call to the file writer
+GENERATOR_BATCH_ROWS = 100000
+
+
+def _codes(prefix, values, width):
+    return np.array([f"{prefix}{value:0{width}d}" for value in values], dtype=object)
+
+
+def build_dimensions(stores, articles, rng):
+    """
+    Per-store and per-article attribute arrays, indexed by store and article number, so
+    every row of a store or article carries the same attributes
+    """
+    store_numbers = np.arange(stores)
+    store_city = rng.integers(0, len(CITIES), stores)
+    store_dimensions = {
+        "p1_dc": _codes("R", store_numbers, 3),
+        "store_no": _codes("S", store_numbers, 4),
+        "format": np.array(STORE_FORMATS, dtype=object)[rng.integers(0, len(STORE_FORMATS), stores)],
+        "city": np.array([CITIES[i][0] for i in store_city], dtype=object),
+        "state": np.array([CITIES[i][1] for i in store_city], dtype=object),
+        "region": np.array([CITIES[i][2] for i in store_city], dtype=object),
+        "pin_code": np.array(
+            [f"{CITIES[i][3]}{pin:03d}" for i, pin in zip(store_city, rng.integers(1, 999, stores))],
+            dtype=object,
+        ),
+    }
+
+    article_numbers = np.arange(articles)
+    article_brick = rng.integers(0, len(BRICKS), articles)
+    article_brand = np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), articles)]
+    # FI<group><brick>001: class_code and family_code are its 6 and 4 character prefixes
+    brick_codes = np.array([f"FI{brick // 3 + 1:02d}{brick + 1:02d}001" for brick in article_brick], dtype=object)
+    article_dimensions = {
+        "article_id": np.array([str(491000000 + number) for number in article_numbers], dtype=object),
+        "brand": article_brand,
+        "brick_code": brick_codes,
+        "brick_description": np.array(BRICKS, dtype=object)[article_brick],
+        "class_code": np.array([code[:6] for code in brick_codes], dtype=object),
+        "class": np.array([f"{BRICKS[i].split()[-1]} SOLUTIONS" for i in article_brick], dtype=object),
+        "family_code": np.array([code[:4] for code in brick_codes], dtype=object),
+        "segment_code": np.full(articles, "FI", dtype=object),
+        "segment": np.full(articles, "SMALL APPLIANCES", dtype=object),
+        "division": np.full(articles, "CDIT", dtype=object),
+        "division_code": np.full(articles, "902", dtype=object),
+        "vertical": np.full(articles, "Electronics", dtype=object),
+        "sd": np.array([f"{brand} Model{number % 100:02d}" for brand, number in zip(article_brand, article_numbers)], dtype=object),
+        "article_description": np.array(
+            [f"{brand.upper()} {BRICKS[brick]} {number}" for brand, brick, number in zip(article_brand, article_brick, article_numbers)],
+            dtype=object,
+        ),
+        "kvi": np.where(rng.random(articles) < 0.1, "Y", "NA").astype(object),
+        "npi": np.where(rng.random(articles) < 0.05, "Y", "NA").astype(object),
+    }
+    return store_dimensions, article_dimensions
+
+
+def generate_batch(rows, week_start_date, store_dimensions, article_dimensions, family_articles, rng):
+    """One Arrow batch of forecast rows for a partition, with the columns in CSV header order"""
+    stores = rng.integers(0, len(store_dimensions["store_no"]), rows)
+    articles = rng.choice(family_articles, rows)
+
+    forecast_qty = rng.lognormal(mean=0.5, sigma=0.9, size=rows)
+    sold_qty = rng.poisson(forecast_qty).astype(np.float64)
+    consensus_qty = np.where(rng.random(rows) < 0.2, np.round(forecast_qty), 0.0)
+
+    columns = {
+        **{name: values[stores] for name, values in store_dimensions.items()},
+        **{name: values[articles] for name, values in article_dimensions.items()},
+        "forecast_qty": forecast_qty,
+        "sold_qty": sold_qty,
+        "consensus_qty": consensus_qty,
+        "batchno": np.full(rows, week_start_date.strftime("%Y%m%d"), dtype=object),
+        "status": np.where(rng.random(rows) < 0.97, "active", "inactive").astype(object),
+        "month_year": np.full(rows, week_start_date.strftime("%m-%Y"), dtype=object),
+        "wom": np.full(rows, (week_start_date.day - 1) // 7 + 1, dtype=np.int64),
+    }
+    return pa.record_batch([pa.array(columns[name]) for name in FORECAST_CSV_COLUMNS], names=FORECAST_CSV_COLUMNS)
+
+
+def write_part_file(path, file_format, rows, make_batch):
+    """Write a part file batch by batch, so memory stays flat however many rows it holds"""
+    writer = None
+    try:
+        remaining = rows
+        while remaining > 0:
+            batch = make_batch(min(remaining, GENERATOR_BATCH_ROWS))
+            if writer is None:
+                if file_format == "parquet":
+                    writer = pq.ParquetWriter(path, batch.schema, compression="snappy")
+                else:
+                    writer = pacsv.CSVWriter(path, batch.schema)
+            writer.write_batch(batch)
+            remaining -= batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def generate_forecast_data(
+    output_dir,
+    file_format="csv",
+    start_week=date(2025, 1, 6),
+    weeks=4,
+    families=4,
+    store_types=("offline", "online"),
+    rows_per_partition=100000,
+    files_per_partition=1,
+    stores=500,
+    articles=2000,
+    seed=0,
+):
+    """
+    Write a synthetic forecast drop under output_dir, replacing what is there
+
+    Articles are split evenly across the families; every partition samples stores and its
+    family's articles uniformly.
+
+    Returns:
+        Dict with the number of partitions, files and rows written, and the article ids by family
+    """
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+
+    store_dimensions, article_dimensions = build_dimensions(stores, articles, rng)
+    family_names = [FAMILIES[i] if i < len(FAMILIES) else f"FAMILY {i + 1}" for i in range(families)]
+    family_article_numbers = {
+        family: np.arange(articles)[index::len(family_names)] for index, family in enumerate(family_names)
+    }
+    extension = ".snappy.parquet" if file_format == "parquet" else ".csv"
+
+    partitions = 0
+    files = 0
+    for week_index in range(weeks):
+        week_start_date = start_week + timedelta(weeks=week_index)
+        for family in family_names:
+            for store_type in store_types:
+                partition_dir = (
+                    output_dir
+                    / f"week_start_date={week_start_date.isoformat()}"
+                    / f"family={family}"
+                    / f"channel_online_offline={store_type}"
+                )
+                partition_dir.mkdir(parents=True)
+                file_rows = np.array_split(np.arange(rows_per_partition), files_per_partition)
+                for part_number, part_rows in enumerate(file_rows):
+                    path = partition_dir / f"part-{part_number:05d}-{uuid4()}-c000{extension}"
+                    write_part_file(
+                        str(path),
+                        file_format,
+                        len(part_rows),
+                        lambda rows: generate_batch(
+                            rows, week_start_date, store_dimensions, article_dimensions,
+                            family_article_numbers[family], rng,
+                        ),
+                    )
+                    files += 1
+                (partition_dir / "_SUCCESS").touch()
+                partitions += 1
+
+    return {
+        "partitions": partitions,
+        "files": files,
+        "rows": partitions * rows_per_partition,
+        "article_ids": {
+            family: article_dimensions["article_id"][numbers].tolist()
+            for family, numbers in family_article_numbers.items()
+        },
+    }
+
+
+def generate_catalog(output_dir, article_ids, seed=0):
+    """
+    Write a catalog Parquet file for article_ids, with the product_sku_id,
+    category_hierarchy and attributes columns /utils/substitute reads
+    """
+    rng = np.random.default_rng(seed)
+    output_dir = Path(output_dir)
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+
+    segments = ["Kitchen", "Home Care", "Entertainment", "Mobiles"]
+    hierarchy_type = pa.struct([("codes", pa.list_(pa.string())), ("names", pa.list_(pa.string()))])
+    category_hierarchy = []
+    attributes = []
+    for number, article_id in enumerate(article_ids):
+        segment = segments[number % len(segments)]
+        category_hierarchy.append({
+            "codes": ["83", f"83{number % len(segments):02d}", f"83{number % len(segments):02d}{number % 50:03d}"],
+            "names": ["Electronics", segment, f"{segment} Class {number % 50}"],
+        })
+        attributes.append([
+            ("final_title", f"synthetic product {article_id}"),
+            ("brand_name", BRANDS[number % len(BRANDS)].lower()),
+            ("mrp", f"{rng.integers(500, 50000)}.0"),
+        ])
+
+    table = pa.table({
+        "attributes": pa.array(attributes, type=pa.map_(pa.string(), pa.string())),
+        "category_hierarchy": pa.array(category_hierarchy, type=hierarchy_type),
+        "pack_info": pa.array(["unit"] * len(article_ids)),
+        "product_id": pa.array([uuid4().hex for _ in article_ids]),
+        "product_sku_id": pa.array(list(article_ids), type=pa.string()),
+    })
+    pq.write_table(table, str(output_dir / f"part-00000-{uuid4()}-c000.snappy.parquet"), compression="snappy")
+    (output_dir / "_SUCCESS").touch()
+    return len(article_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Hive-partitioned forecast drop")
+    parser.add_argument("--output-dir", default="data_synthetic")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--start-week", type=date.fromisoformat, default=date(2025, 1, 6))
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--families", type=int, default=4)
+    parser.add_argument("--store-types", default="offline,online", help="Comma-separated channel values")
+    parser.add_argument("--rows-per-partition", type=int, default=100000)
+    parser.add_argument("--files-per-partition", type=int, default=1)
+    parser.add_argument("--stores", type=int, default=500, help="Distinct store_no values")
+    parser.add_argument("--articles", type=int, default=2000, help="Distinct article_id values, split across families")
+    parser.add_argument("--catalog-dir", help="Also write a catalog Parquet file for /utils/substitute here")
+    parser.add_argument("--catalog-fraction", type=float, default=0.5, help="Share of the articles in the catalog")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = generate_forecast_data(
+        args.output_dir,
+        file_format=args.format,
+        start_week=args.start_week,
+        weeks=args.weeks,
+        families=args.families,
+        store_types=[store_type.strip() for store_type in args.store_types.split(",") if store_type.strip()],
+        rows_per_partition=args.rows_per_partition,
+        files_per_partition=args.files_per_partition,
+        stores=args.stores,
+        articles=args.articles,
+        seed=args.seed,
+    )
+    print(
+        f"Wrote {result['rows']} rows in {result['files']} files ({result['partitions']} partitions) "
+        f"to {args.output_dir} in {time.perf_counter() - started:.1f}s"
+    )
+
+    if args.catalog_dir:
+        article_ids = [article_id for ids in result["article_ids"].values() for article_id in ids]
+        catalog_articles = article_ids[:int(len(article_ids) * args.catalog_fraction)]
+        generate_catalog(args.catalog_dir, catalog_articles, seed=args.seed)
+        print(f"Wrote a catalog of {len(catalog_articles)} articles to {args.catalog_dir}")
+
+
+if __name__ == "__main__":
+    main()
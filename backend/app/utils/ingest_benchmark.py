@@ -0,0 +1,258 @@
+"""
+Ingest benchmark for /core/load-data and /utils/substitute.
+
+Runs the load and substitution job functions directly against the Postgres configured in
+.env and reports rows per second, peak RSS and per stage timings. Use a scratch database:
+the forecast and forecast_fnl tables are replaced.
+
+Every run is appended to a JSON lines results file and compared with the previous run of
+the same configuration (source, format, workers, data size); a drop in throughput beyond
+--regression-threshold makes the command exit with status 1.
+
+Run from backend/app:
+    python -m utils.forecast_generator --output-dir data_synthetic --catalog-dir data_synthetic_catalog
+    python -m utils.ingest_benchmark --data-dir data_synthetic --catalog-dir data_synthetic_catalog
+"""
+
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import asyncio
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from settings import Settings
+from db.postgres_db import PostgresDatabase
+from schema import Forecast, ForecastFnl
+from core.forecast_dataset import scan_partitions
+from core.forecast_loader import FORECAST_COPY_COLUMNS
+from core.routes import run_forecast_load
+from utils.upload import run_catalog_substitution
+
+DEFAULT_RESULTS_FILE = "ingest_benchmark_results.jsonl"
+
+
+class BenchmarkProgress:
+    """Stands in for core.jobs.JobProgress when a job function runs outside the JobManager"""
+
+    def __init__(self):
+        self.rows_processed = 0
+        self.current_file = None
+        self.errors = []
+
+    async def update(self, rows=0, current_file=None, error=None):
+        self.rows_processed += rows
+        if current_file is not None:
+            self.current_file = current_file
+        if error is not None:
+            self.errors.append(error)
+
+    async def flush(self, **values):
+        pass
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size so far; RUSAGE_CHILDREN covers finished worker processes"""
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_result(stage, rows, seconds, **details):
+    return {
+        "stage": stage,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        **details,
+    }
+
+
+async def benchmark_load(postgres_db, data_dir, file_format, workers, clear_existing):
+    progress = BenchmarkProgress()
+    started = time.perf_counter()
+    result = await run_forecast_load(
+        progress,
+        postgres_db,
+        clear_existing=clear_existing,
+        load_workers=workers,
+        source_format=file_format,
+        data_dir=data_dir,
+    )
+    return stage_result(
+        "load" if clear_existing else "reload_unchanged",
+        result["total_records_loaded"],
+        time.perf_counter() - started,
+        partitions_loaded=result["partitions_loaded"],
+        partitions_unchanged=result["partitions_unchanged"],
+        stage_seconds=result["stage_seconds"],
+        errors=result["errors"],
+    )
+
+
+async def benchmark_substitute(postgres_db, catalog_dir):
+    # The substitution updates forecast_fnl by article_id, so seed it with the loaded rows
+    columns = ", ".join(f'"{column}"' for column in FORECAST_COPY_COLUMNS.values())
+    started = time.perf_counter()
+    await postgres_db.execute(f"TRUNCATE TABLE {ForecastFnl.__tablename__}")
+    await postgres_db.execute(
+        f"INSERT INTO {ForecastFnl.__tablename__} ({columns}) SELECT {columns} FROM {Forecast.__tablename__}"
+    )
+    setup_seconds = time.perf_counter() - started
+
+    parquet_files = sorted(glob.glob(str(Path(catalog_dir) / "**" / "*.parquet"), recursive=True))
+    progress = BenchmarkProgress()
+    started = time.perf_counter()
+    result = await run_catalog_substitution(progress, postgres_db, parquet_files)
+    return stage_result(
+        "substitute",
+        result["details"]["total_entries_processed"],
+        time.perf_counter() - started,
+        rows_updated=result["details"]["total_rows_updated"],
+        stage_seconds={"seed_forecast_fnl": round(setup_seconds, 3)},
+    )
+
+
+def benchmark_config(args):
+    """What a run is compared on: the source, its size, and the load settings"""
+    partitions, _ = scan_partitions(args.format, args.data_dir)
+    return {
+        "data_dir": str(args.data_dir),
+        "format": args.format,
+        "workers": args.workers or os.cpu_count(),
+        "partitions": len(partitions),
+        "bytes": sum(file_info["size"] for partition in partitions for file_info in partition["files"]),
+        "catalog": bool(args.catalog_dir),
+    }
+
+
+async def run_benchmark(args):
+    settings = Settings()
+    postgres = PostgresDatabase(settings)
+    await postgres.connect()
+    await postgres.create_tables()
+    postgres_db = postgres.database
+
+    stages = []
+    output = sys.stdout if args.verbose else open(os.devnull, "w")
+    try:
+        with redirect_stdout(output):
+            for _ in range(args.repeat):
+                stages.append(await benchmark_load(postgres_db, args.data_dir, args.format, args.workers, True))
+                stages.append(await benchmark_load(postgres_db, args.data_dir, args.format, args.workers, False))
+            if args.catalog_dir:
+                stages.append(await benchmark_substitute(postgres_db, args.catalog_dir))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        await postgres_db.disconnect()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "config": benchmark_config(args),
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_workers_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def best_rows_per_second(run, stage):
+    rates = [result["rows_per_second"] for result in run["stages"] if result["stage"] == stage and result["rows_per_second"]]
+    return max(rates) if rates else None
+
+
+def previous_run(results_file, config):
+    """Most recent stored run with the same configuration"""
+    if not results_file.exists():
+        return None
+    previous = None
+    with open(results_file) as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                if run["config"] == config:
+                    previous = run
+    return previous
+
+
+def report(run, previous, regression_threshold):
+    """
+    Print the run and its change against the previous one
+
+    Returns:
+        True if a stage got slower than regression_threshold allows
+    """
+    print(f"Peak RSS: {run['peak_rss_mb']} MB (loader), {run['peak_rss_workers_mb']} MB (largest worker)")
+    for result in run["stages"]:
+        print(
+            f"{result['stage']:>18}: {result['rows']} rows in {result['seconds']}s"
+            f" ({result['rows_per_second'] or 0:,.0f} rows/s) {json.dumps(result.get('stage_seconds', {}))}"
+        )
+        for error in result.get("errors") or []:
+            print(f"{'':>20}error: {error}")
+
+    regressed = False
+    if previous is None:
+        print("No earlier run with this configuration to compare with")
+        return regressed
+    for stage in ("load", "substitute"):
+        current_rate = best_rows_per_second(run, stage)
+        previous_rate = best_rows_per_second(previous, stage)
+        if not current_rate or not previous_rate:
+            continue
+        change = current_rate / previous_rate - 1
+        flag = ""
+        if change < -regression_threshold:
+            regressed = True
+            flag = "  REGRESSION"
+        print(
+            f"{stage}: {current_rate:,.0f} rows/s vs {previous_rate:,.0f} rows/s at "
+            f"{previous['git_revision']} ({change:+.1%}){flag}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark forecast ingestion against the configured Postgres")
+    parser.add_argument("--data-dir", type=Path, default=Path("data_synthetic"))
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="Parse worker processes (default: CPU count)")
+    parser.add_argument("--catalog-dir", help="Catalog Parquet files to benchmark /utils/substitute with")
+    parser.add_argument("--repeat", type=int, default=1, help="Full loads to run; the fastest is compared")
+    parser.add_argument("--results", type=Path, default=Path(DEFAULT_RESULTS_FILE))
+    parser.add_argument("--regression-threshold", type=float, default=0.1, help="Allowed rows/s drop, e.g. 0.1 for 10%%")
+    parser.add_argument("--verbose", action="store_true", help="Show the loader's own output")
+    args = parser.parse_args()
+
+    if not args.data_dir.exists():
+        parser.error(f"{args.data_dir} not found; generate it with python -m utils.forecast_generator")
+
+    run = asyncio.run(run_benchmark(args))
+    previous = previous_run(args.results, run["config"])
+    regressed = report(run, previous, args.regression_threshold)
+
+    with open(args.results, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"Results appended to {args.results}")
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
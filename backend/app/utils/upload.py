@@ -7,6 +7,7 @@ from fastapi import APIRouter, HTTPException, Depends
 import pandas as pd
 from fastapi import Request
 from utils.commons import get_postgres_db
+from core.jobs import JobSubmittedResponse, get_job_manager, job_submitted_response
 
 router = APIRouter(prefix="/utils", tags=["utils"])
 
@@ -368,10 +369,58 @@ async def get_catalog_columns() -> Dict[str, Any]:
             detail=f"Internal server error: {str(e)}"
         )
 
-@router.post("/substitute")
-async def substitute_catalog_data(request: Request, db=Depends(get_postgres_db)) -> Dict[str, Any]:
+def find_catalog_parquet_files():
+    """
+    Find the parquet files in the catalog_data folder
+    
+    Raises HTTPException(404) if the folder or the files are missing
+    """
+    # Get the path to the catalog_data folder
+    current_dir = Path(__file__).parent
+    catalog_data_path = current_dir / "catalog_data"
+    
+    if not catalog_data_path.exists():
+        raise HTTPException(
+            status_code=404, 
+            detail=f"Catalog data folder not found at {catalog_data_path}"
+        )
+    
+    # Find all parquet files in the catalog_data folder
+    parquet_files = []
+    for pattern in ["*.parquet", "*.snappy.parquet"]:
+        parquet_files.extend(glob.glob(str(catalog_data_path / "**" / pattern), recursive=True))
+    
+    if not parquet_files:
+        raise HTTPException(
+            status_code=404, 
+            detail="No parquet files found in catalog_data folder"
+        )
+    
+    return parquet_files
+
+@router.post("/substitute", response_model=JobSubmittedResponse, status_code=202)
+async def substitute_catalog_data(
+    request: Request,
+    db=Depends(get_postgres_db),
+    job_manager=Depends(get_job_manager),
+) -> Dict[str, Any]:
+    """
+    Substitute catalog data from parquet files into PostgreSQL ForecastFNL table.
+    
+    The substitution runs as a background job and this returns its id immediately.
+    Poll GET /jobs/{job_id} for progress and the substitution details.
+    
+    Returns:
+        Dict containing the job id and its status URL
+    """
+    parquet_files = find_catalog_parquet_files()
+    job_id = await job_manager.submit("substitute", run_catalog_substitution, db, parquet_files)
+    return job_submitted_response(job_id)
+
+async def run_catalog_substitution(progress, db, parquet_files) -> Dict[str, Any]:
     """
     Substitute catalog data from parquet files into PostgreSQL ForecastFNL table.
+    Runs as a background job.
     
     Returns:
         Dict containing substitution status and details
@@ -394,29 +443,6 @@ async def substitute_catalog_data(request: Request, db=Depends(get_postgres_db))
             except:
                 return False
         
-        # Get database connection
-        
-        # Get the path to the catalog_data folder
-        current_dir = Path(__file__).parent
-        catalog_data_path = current_dir / "catalog_data"
-        
-        if not catalog_data_path.exists():
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Catalog data folder not found at {catalog_data_path}"
-            )
-        
-        # Find all parquet files in the catalog_data folder
-        parquet_files = []
-        for pattern in ["*.parquet", "*.snappy.parquet"]:
-            parquet_files.extend(glob.glob(str(catalog_data_path / "**" / pattern), recursive=True))
-        
-        if not parquet_files:
-            raise HTTPException(
-                status_code=404, 
-                detail="No parquet files found in catalog_data folder"
-            )
-        
         print(f"Found {len(parquet_files)} parquet files to process")
         
         # Calculate total rows across all files first
@@ -445,6 +471,7 @@ async def substitute_catalog_data(request: Request, db=Depends(get_postgres_db))
         for file_idx, (file_path, file_rows) in enumerate(file_info):
             try:
                 print(f"\nProcessing file {file_idx + 1}/{len(parquet_files)}: {Path(file_path).name}")
+                await progress.update(current_file=file_path)
                 
                 # Read parquet file
                 df = pd.read_parquet(file_path)
@@ -529,35 +556,37 @@ async def substitute_catalog_data(request: Request, db=Depends(get_postgres_db))
                         print(f"\nDEBUG: Updating product_sku_id: {product_sku_id}")
                         print(f"DEBUG: Update values: {update_values}")
                         
-                        result = await db.execute(update_query)
+                        # databases has no rowcount, so count the updated ids instead
+                        updated_rows = await db.fetch_all(update_query.returning(ForecastFnl.id))
+                        rowcount = len(updated_rows)
                         
                         # Debug: Print the result
-                        print(f"DEBUG: Update result - rowcount: {result.rowcount}")
+                        print(f"DEBUG: Update result - rowcount: {rowcount}")
                         
-                        if result.rowcount > 0:
-                            total_updated += result.rowcount
-                            print(f"DEBUG: Successfully updated {result.rowcount} rows for product_sku_id: {product_sku_id}")
+                        if rowcount > 0:
+                            total_updated += rowcount
+                            print(f"DEBUG: Successfully updated {rowcount} rows for product_sku_id: {product_sku_id}")
                         else:
                             print(f"DEBUG: No rows found to update for product_sku_id: {product_sku_id}")
                             # Try to find if the row exists
                             select_query = select(ForecastFnl).where(ForecastFnl.article_id == str(product_sku_id))
-                            check_result = await db.execute(select_query)
-                            existing_rows = check_result.fetchall()
+                            existing_rows = await db.fetch_all(select_query)
                             print(f"DEBUG: Found {len(existing_rows)} existing rows with article_id: {product_sku_id}")
                         
-                        # Commit the transaction after each update
-                        await db.commit()
+                        # Each update is committed on its own (databases autocommits outside a transaction)
                         
                         total_processed += 1
                         
                         # Progress indicator with cumulative row count
                         if total_processed % 100 == 0 or total_processed == total_rows_across_files:
+                            await progress.update(rows=total_processed - progress.rows_processed)
                             print(f"\rProgress: {total_processed}/{total_rows_across_files} rows processed | Total updated: {total_updated} | Current file: {Path(file_path).name}", end="", flush=True)
                         
                     except Exception as e:
                         print(f"\nError processing row {row_idx + 1} in file {file_path}: {str(e)}")
                         raise Exception(f"Failed to process row {row_idx + 1} in file {file_path}: {str(e)}")
                 
+                await progress.update(rows=total_processed - progress.rows_processed)
                 print(f"\nCompleted file {file_idx + 1}/{len(parquet_files)}: {Path(file_path).name}")
                 
             except Exception as e: